@@ -3,9 +3,14 @@ from secure_steg_crypto_full import (
     hide_image_flow, extract_image_flow,
     hide_audio_flow, extract_audio_flow,
     extract_bytes_from_image, extract_bytes_from_wav,
-    decrypt_message_from_payload
+    decrypt_message_from_payload, enable_key_cache, NotStegoError,
+    enable_payload_cache, cached_extract
 )
-import tempfile
+
+# Streamlit reruns this script on every interaction; the caches live in the imported module and survive reruns.
+# Re-extracting the same upload (e.g. after a mistyped password) reuses the key and the extracted ciphertext.
+enable_key_cache()
+enable_payload_cache()
 
 # -------------------- Streamlit Page Setup --------------------
 st.set_page_config(page_title="🔒 Secure StegoCrypt", layout="wide")
@@ -24,21 +29,15 @@ if mode == "🖼️ Image":
         st.subheader("📥 Hide Message in Image")
         cover_file = st.file_uploader("Upload Cover Image (PNG/BMP)", type=["png", "bmp"])
         message = st.text_area("Enter Secret Message")
+        scatter = st.checkbox("Scatter bits over password-keyed positions")
 
         if st.button("🔐 Hide Message"):
             if not (cover_file and message and password):
                 st.warning("Please provide all fields.")
             else:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp:
-                    temp.write(cover_file.read())
-                    temp_path = temp.name
-
-                out_path = tempfile.mktemp(suffix=".png")
-                hide_image_flow(temp_path, out_path, message, password)
+                stego = hide_image_flow(cover_file.getvalue(), None, message, password, scatter=scatter)
                 st.success("✅ Message embedded successfully!")
-
-                with open(out_path, "rb") as f:
-                    st.download_button("⬇️ Download Stego Image", f, file_name="stego.png")
+                st.download_button("⬇️ Download Stego Image", stego, file_name="stego.png")
 
     else:
         st.subheader("📤 Extract Message from Image")
@@ -48,15 +47,13 @@ if mode == "🖼️ Image":
             if not (stego_file and password):
                 st.warning("Please provide file and password.")
             else:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp:
-                    temp.write(stego_file.read())
-                    temp_path = temp.name
-
-                payload = extract_bytes_from_image(temp_path)
                 try:
+                    payload = cached_extract(extract_bytes_from_image, stego_file.getvalue(), password=password)
                     msg = decrypt_message_from_payload(payload, password)
                     st.success("✅ Message Extracted Successfully")
                     st.code(msg)
+                except NotStegoError as e:
+                    st.error(f"❌ No hidden message found: {e}")
                 except Exception as e:
                     st.error(f"❌ Decryption failed: {e}")
 
@@ -64,23 +61,17 @@ if mode == "🖼️ Image":
 elif mode == "🎵 Audio":
     if action == "Hide Message":
         st.subheader("📥 Hide Message in Audio")
-        cover_audio = st.file_uploader("Upload WAV File (16-bit PCM)", type=["wav"])
+        cover_audio = st.file_uploader("Upload WAV File (PCM)", type=["wav"])
         message = st.text_area("Enter Secret Message")
+        scatter = st.checkbox("Scatter bits over password-keyed positions")
 
         if st.button("🔐 Hide Message"):
             if not (cover_audio and message and password):
                 st.warning("Please provide all fields.")
             else:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp:
-                    temp.write(cover_audio.read())
-                    temp_path = temp.name
-
-                out_path = tempfile.mktemp(suffix=".wav")
-                hide_audio_flow(temp_path, out_path, message, password)
+                stego = hide_audio_flow(cover_audio.getvalue(), None, message, password, scatter=scatter)
                 st.success("✅ Message embedded successfully!")
-
-                with open(out_path, "rb") as f:
-                    st.download_button("⬇️ Download Stego Audio", f, file_name="stego.wav")
+                st.download_button("⬇️ Download Stego Audio", stego, file_name="stego.wav")
 
     else:
         st.subheader("📤 Extract Message from Audio")
@@ -90,14 +81,12 @@ elif mode == "🎵 Audio":
             if not (stego_audio and password):
                 st.warning("Please provide file and password.")
             else:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp:
-                    temp.write(stego_audio.read())
-                    temp_path = temp.name
-
-                payload = extract_bytes_from_wav(temp_path)
                 try:
+                    payload = cached_extract(extract_bytes_from_wav, stego_audio.getvalue(), password=password)
                     msg = decrypt_message_from_payload(payload, password)
                     st.success("✅ Message Extracted Successfully")
                     st.code(msg)
+                except NotStegoError as e:
+                    st.error(f"❌ No hidden message found: {e}")
                 except Exception as e:
                     st.error(f"❌ Decryption failed: {e}")
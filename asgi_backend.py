@@ -0,0 +1,290 @@
+"""
+Async (ASGI) variant of backend.py: same endpoints and form field names, built for many slow clients.
+Uploads are parsed incrementally as they arrive (with a size cap), KDF + LSB work runs in a process
+pool with a bounded number of concurrent jobs, and every response carries Server-Timing headers.
+Run with:
+    uvicorn asgi_backend:app --host 0.0.0.0 --port 5000
+Requires: starlette, python-multipart (and an ASGI server such as uvicorn).
+"""
+
+import asyncio
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+try:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from secure_steg_crypto_full import (
+    hide_image_flow, hide_audio_flow, hide_image_file_flow, hide_audio_file_flow,
+    extract_bytes_from_image, extract_bytes_from_wav, enable_key_cache, NotStegoError, PayloadTooLargeError,
+    hide_message_job, hide_file_job, extract_job, parse_form_flag
+)
+
+# ---------------- Settings (env overridable, same names as backend.py) ----------------
+STEG_WORKERS = int(os.environ.get("STEG_WORKERS", os.cpu_count() or 1))
+STEG_MAX_JOBS = int(os.environ.get("STEG_MAX_JOBS", STEG_WORKERS))  # jobs handed to the pool at once
+STEG_MAX_PENDING = int(os.environ.get("STEG_MAX_PENDING", STEG_WORKERS * 4))  # requests waiting for a job slot
+STEG_JOB_TIMEOUT = float(os.environ.get("STEG_JOB_TIMEOUT", 60))
+STEG_RETRY_AFTER = int(os.environ.get("STEG_RETRY_AFTER", 5))
+STEG_MAX_UPLOAD = int(os.environ.get("STEG_MAX_UPLOAD", 64 * 1024 * 1024))
+
+log = logging.getLogger(__name__)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class BadForm(Exception):
+    pass
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+# ---------------- Streaming multipart ----------------
+async def read_form(request, max_size=None):
+    """
+    Parse a multipart/form-data body chunk by chunk as the client sends it.
+    Returns {field name: bytes}; raises UploadTooLarge as soon as more than max_size bytes
+    (default STEG_MAX_UPLOAD) arrive.
+    """
+    if max_size is None:
+        max_size = STEG_MAX_UPLOAD
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_size:
+        raise UploadTooLarge()
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise BadForm("Expected multipart/form-data")
+
+    parts = {}
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(header_field=bytearray(), header_value=bytearray(), name=None, data=io.BytesIO())
+
+    def on_header_field(data, start, end):
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        if bytes(part["header_field"]).lower() == b"content-disposition":
+            _, disposition = parse_options_header(bytes(part["header_value"]))
+            part["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        part["header_field"] = bytearray()
+        part["header_value"] = bytearray()
+
+    def on_part_data(data, start, end):
+        part["data"].write(data[start:end])
+
+    def on_part_end():
+        if part["name"]:
+            parts[part["name"]] = part["data"].getvalue()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_size:
+                raise UploadTooLarge()
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise BadForm(f"Malformed multipart body: {e}")
+    return parts
+
+
+# ---------------- Job execution ----------------
+class JobRunner:
+    """
+    Runs CPU-heavy jobs in a process pool. At most max_jobs are handed to the pool at once, up to
+    max_pending more requests wait for a slot, and anything beyond that is rejected with PoolSaturated.
+    """
+
+    def __init__(self, workers, max_jobs, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(max_jobs)
+        self._executor = None
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=enable_key_cache)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, timings, fn, *args):
+        if self.waiting >= self.max_pending:
+            raise PoolSaturated()
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        timings["queue"] = time.perf_counter() - queued
+        started = time.perf_counter()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # released by the future, not by this coroutine: wait_for may give up while the worker keeps going
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        finally:
+            timings["job"] = time.perf_counter() - started
+
+
+runner = JobRunner(STEG_WORKERS, STEG_MAX_JOBS, STEG_MAX_PENDING, STEG_JOB_TIMEOUT)
+
+
+# ---------------- Routes ----------------
+def timed(handler):
+    """
+    Wrap a route: map the service errors to responses and attach request-level timing headers. Anything else
+    is logged and answered with a JSON 500, so every response carries the timing headers.
+    """
+    async def endpoint(request):
+        start = time.perf_counter()
+        timings = {}
+        try:
+            response = await handler(request, timings)
+        except UploadTooLarge:
+            response = JSONResponse({"error": "Upload too large"}, status_code=413)
+        except BadForm as e:
+            response = JSONResponse({"error": str(e)}, status_code=400)
+        except PoolSaturated:
+            response = JSONResponse({"error": "Server busy, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(STEG_RETRY_AFTER)})
+        except asyncio.TimeoutError:
+            response = JSONResponse({"error": "Processing timed out"}, status_code=504)
+        except Exception:
+            log.exception("Unhandled error in %s", request.url.path)
+            response = JSONResponse({"error": "Internal server error"}, status_code=500)
+        timings["total"] = time.perf_counter() - start
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items())
+        response.headers["X-Process-Time"] = f"{timings['total']:.4f}"
+        return response
+    return endpoint
+
+
+async def _form(request, timings):
+    started = time.perf_counter()
+    form = await read_form(request)
+    timings["upload"] = time.perf_counter() - started
+    return form
+
+
+def _text(form, name):
+    return form[name].decode("utf-8")
+
+
+def _flag(form, name):
+    return parse_form_flag(form.get(name, b""))
+
+
+def _hide_route(file_field, flow, file_flow, media_type, download_name):
+    async def handler(request, timings):
+        form = await _form(request, timings)
+        # the secret is either a text message or an uploaded file (payload_file)
+        if file_field not in form or "password" not in form or ("message" not in form and "payload_file" not in form):
+            return JSONResponse({"error": "Missing required fields"}, status_code=400)
+        try:
+            if "payload_file" in form:
+                stego = await runner.run(timings, hide_file_job, file_flow, form[file_field], form["payload_file"],
+                                         _text(form, "password"))
+            else:
+                stego = await runner.run(timings, hide_message_job, flow, form[file_field], _text(form, "message"),
+                                         _text(form, "password"), _flag(form, "scatter"))
+        except (PoolSaturated, asyncio.TimeoutError):
+            raise
+        except PayloadTooLargeError as e:
+            return JSONResponse({"error": str(e)}, status_code=413)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=422)
+        except Exception as e:
+            return JSONResponse({"error": f"Embedding failed: {e}"}, status_code=500)
+        return Response(stego, media_type=media_type,
+                        headers={"Content-Disposition": f'attachment; filename="{download_name}"'})
+    return timed(handler)
+
+
+def _extract_route(file_field, extract_fn):
+    async def handler(request, timings):
+        form = await _form(request, timings)
+        if file_field not in form or "password" not in form:
+            return JSONResponse({"error": "Missing required fields"}, status_code=400)
+        try:
+            as_file = _flag(form, "as_file")
+            _, plain, error = await runner.run(timings, extract_job, extract_fn, form[file_field],
+                                               _text(form, "password"), None, as_file)
+            if error is not None:
+                raise ValueError(error)
+            if as_file:
+                return Response(plain, media_type="application/octet-stream",
+                                headers={"Content-Disposition": 'attachment; filename="payload.bin"'})
+            return JSONResponse({"message": plain})
+        except (PoolSaturated, asyncio.TimeoutError):
+            raise
+        except NotStegoError as e:
+            return JSONResponse({"error": str(e)}, status_code=422)
+        except Exception as e:
+            return JSONResponse({"error": f"Decryption failed: {e}"}, status_code=500)
+    return timed(handler)
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    runner.start()
+    try:
+        yield
+    finally:
+        runner.shutdown()
+
+
+app = Starlette(
+    routes=[
+        Route("/hide_image", _hide_route("cover_file", hide_image_flow, hide_image_file_flow, "image/png", "stego.png"), methods=["POST"]),
+        Route("/extract_image", _extract_route("stego_file", extract_bytes_from_image), methods=["POST"]),
+        Route("/hide_audio", _hide_route("cover_audio", hide_audio_flow, hide_audio_file_flow, "audio/wav", "stego.wav"), methods=["POST"]),
+        Route("/extract_audio", _extract_route("stego_audio", extract_bytes_from_wav), methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=5000)
@@ -1,88 +1,334 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 from secure_steg_crypto_full import (
     hide_image_flow, extract_image_flow,
     hide_audio_flow, extract_audio_flow,
+    hide_image_file_flow, hide_audio_file_flow,
     extract_bytes_from_image, extract_bytes_from_wav,
-    decrypt_message_from_payload
+    enable_key_cache, add_stage_hook, remove_stage_hook, NotStegoError, PayloadTooLargeError,
+    enable_payload_cache, payload_cache_key,
+    hide_message_job, hide_file_job, extract_job, parse_form_flag
 )
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as JobTimeoutError
+import atexit
+import io
+import threading
 import tempfile
+import time
 import os
 
+# ---------------- Worker pool settings (env overridable) ----------------
+STEG_WORKERS = int(os.environ.get("STEG_WORKERS", os.cpu_count() or 1))
+STEG_MAX_PENDING = int(os.environ.get("STEG_MAX_PENDING", STEG_WORKERS * 4))  # running + queued jobs
+STEG_JOB_TIMEOUT = float(os.environ.get("STEG_JOB_TIMEOUT", 60))  # seconds a request waits for its job
+STEG_RETRY_AFTER = int(os.environ.get("STEG_RETRY_AFTER", 5))  # seconds, sent with 503 responses
+STEG_MAX_UPLOAD = int(os.environ.get("STEG_MAX_UPLOAD", 64 * 1024 * 1024))  # bytes per request, bounds memory
+# extracted-payload cache for re-uploaded carriers: "" (off), "memory" or "disk"
+STEG_PAYLOAD_CACHE = os.environ.get("STEG_PAYLOAD_CACHE", "")
+STEG_PAYLOAD_CACHE_DIR = os.environ.get("STEG_PAYLOAD_CACHE_DIR", os.path.join(  # must be private to this user
+    tempfile.gettempdir(), f"steg_payload_cache-{os.getuid()}" if hasattr(os, "getuid") else "steg_payload_cache"))
+STEG_PAYLOAD_CACHE_BYTES = int(os.environ.get("STEG_PAYLOAD_CACHE_BYTES", 64 * 1024 * 1024))
+STEG_PAYLOAD_CACHE_TTL = float(os.environ.get("STEG_PAYLOAD_CACHE_TTL", 600))
+
+
+class InMemoryRequest(Request):
+    """Keep multipart file parts in memory instead of letting Werkzeug spool large ones to temp files."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+app.config["MAX_CONTENT_LENGTH"] = STEG_MAX_UPLOAD
 CORS(app)
+# retries and repeated extractions of the same carrier reuse the PBKDF2 derivation
+enable_key_cache()
+# ... and, when enabled, skip decoding the carrier again (only ciphertext payloads are cached)
+payload_cache = None
+if STEG_PAYLOAD_CACHE:
+    payload_cache = enable_payload_cache(STEG_PAYLOAD_CACHE_BYTES, STEG_PAYLOAD_CACHE_TTL,
+                                         STEG_PAYLOAD_CACHE_DIR if STEG_PAYLOAD_CACHE == "disk" else None)
+
+
+# ---------------- Metrics (Prometheus text exposition) ----------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    "steg_request_duration_seconds": ("histogram", "Request latency by route.", LATENCY_BUCKETS),
+    "steg_stage_duration_seconds": ("histogram", "Time spent in each pipeline stage (kdf, encrypt, image_embed, ...).", LATENCY_BUCKETS),
+    "steg_carrier_bytes": ("histogram", "Size of uploaded carriers by route.", SIZE_BUCKETS),
+    "steg_embedded_bytes_total": ("counter", "Payload bytes embedded into carriers by route.", None),
+    "steg_errors_total": ("counter", "Responses with status >= 400 by route and status.", None),
+    "steg_payload_cache_total": ("counter", "Extracted-payload cache lookups by route and result (hit/miss).", None),
+}
+
+
+class Metrics:
+    """Thread-safe counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}  # (name, sorted label items) -> float, or [bucket counts..., sum, count]
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._values.setdefault(key, [0] * (len(buckets) + 2))
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = {key: (list(v) if isinstance(v, list) else v) for key, v in self._values.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (series_name, labels), value in sorted(values.items()):
+                if series_name != name:
+                    continue
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                for bound, count in zip(buckets, value):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', repr(float(bound))),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(items):
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+metrics = Metrics()
+
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    if request.path != "/metrics" and "started" in g:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe("steg_request_duration_seconds", {"route": route}, time.perf_counter() - g.started)
+        if response.status_code >= 400:
+            metrics.inc("steg_errors_total", {"route": route, "status": str(response.status_code)})
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+class PoolSaturated(Exception):
+    """Raised when the job pool already holds STEG_MAX_PENDING jobs."""
+
+
+class JobPool:
+    """
+    Process pool for the CPU-heavy KDF + LSB work, so requests don't hold the GIL on the request thread.
+    At most max_pending jobs may be running or queued; beyond that submit fails fast with PoolSaturated.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=enable_key_cache)
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, fn, *args):
+        """Run fn(*args) in a worker and wait for it; raises JobTimeoutError after self.timeout seconds."""
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # the slot is held until the worker is actually done, even if the request timed out
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_job_pool():
+    """Create the job pool on first use (not at import time, so worker processes don't spawn pools)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = JobPool(STEG_WORKERS, STEG_MAX_PENDING, STEG_JOB_TIMEOUT)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+def _instrumented(fn, *args):
+    """Worker job wrapper: run fn(*args) and also return the stage timings recorded in the worker."""
+    timings = []
+    hook = add_stage_hook(lambda name, seconds, info: timings.append((name, seconds, dict(info))))
+    try:
+        return fn(*args), timings
+    finally:
+        remove_stage_hook(hook)
+
+def run_job(fn, *args):
+    """Run fn(*args) on the job pool and feed its stage timings into the metrics."""
+    result, timings = get_job_pool().run(_instrumented, fn, *args)
+    for name, seconds, info in timings:
+        metrics.observe("steg_stage_duration_seconds", {"stage": name}, seconds)
+        if name.endswith("_embed"):
+            metrics.inc("steg_embedded_bytes_total", {"route": request.url_rule.rule}, info.get("payload_bytes", 0))
+    return result
+
+def read_upload(field):
+    data = request.files[field].read()
+    metrics.observe("steg_carrier_bytes", {"route": request.url_rule.rule}, len(data))
+    return data
+
+def form_flag(name):
+    return parse_form_flag(request.form.get(name, ""))
+
+def extract_message(extract_fn, stego_bytes, password, as_bytes=False):
+    """Extract and decrypt on the job pool, going through the payload cache when it is enabled."""
+    key = payload = None
+    if payload_cache is not None:
+        key = payload_cache_key(extract_fn, stego_bytes)
+        payload = payload_cache.get(key)
+        metrics.inc("steg_payload_cache_total", {"route": request.url_rule.rule, "result": "miss" if payload is None else "hit"})
+    if payload is None:
+        payload, msg, error = run_job(extract_job, extract_fn, stego_bytes, password, None, as_bytes)
+        if key is not None:
+            payload_cache.put(key, payload)
+    else:
+        _, msg, error = run_job(extract_job, extract_fn, None, password, payload, as_bytes)
+    if error is not None:
+        raise ValueError(error)
+    return msg
+
+@app.errorhandler(PoolSaturated)
+def pool_saturated(_):
+    resp = jsonify({"error": "Server busy, retry later"})
+    resp.headers["Retry-After"] = str(STEG_RETRY_AFTER)
+    return resp, 503
+
+@app.errorhandler(JobTimeoutError)
+def job_timeout(_):
+    return jsonify({"error": "Processing timed out"}), 504
 
 @app.route("/hide_image", methods=["POST"])
 def hide_image():
-    if "cover_file" not in request.files or "message" not in request.form or "password" not in request.form:
+    # the secret is either a text message or an uploaded file (payload_file)
+    if ("cover_file" not in request.files or "password" not in request.form
+            or ("message" not in request.form and "payload_file" not in request.files)):
         return jsonify({"error": "Missing required fields"}), 400
 
-    cover_file = request.files["cover_file"]
-    message = request.form["message"]
+    cover_file = read_upload("cover_file")
     password = request.form["password"]
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp:
-        cover_file.save(temp.name)
-        temp_path = temp.name
-
-    out_path = tempfile.mktemp(suffix=".png")
-    hide_image_flow(temp_path, out_path, message, password)
+    try:
+        if "payload_file" in request.files:
+            stego = run_job(hide_file_job, hide_image_file_flow, cover_file, request.files["payload_file"].read(), password)
+        else:
+            stego = run_job(hide_message_job, hide_image_flow, cover_file, request.form["message"], password, form_flag("scatter"))
+    except (PoolSaturated, JobTimeoutError):
+        raise
+    except PayloadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+    except Exception as e:
+        return jsonify({"error": f"Embedding failed: {e}"}), 500
 
-    return send_file(out_path, as_attachment=True, download_name="stego.png")
+    return send_file(io.BytesIO(stego), mimetype="image/png", as_attachment=True, download_name="stego.png")
 
 @app.route("/extract_image", methods=["POST"])
 def extract_image():
     if "stego_file" not in request.files or "password" not in request.form:
         return jsonify({"error": "Missing required fields"}), 400
 
-    stego_file = request.files["stego_file"]
+    stego_file = read_upload("stego_file")
     password = request.form["password"]
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp:
-        stego_file.save(temp.name)
-        temp_path = temp.name
-
-    payload = extract_bytes_from_image(temp_path)
     try:
-        msg = decrypt_message_from_payload(payload, password)
+        if form_flag("as_file"):
+            data = extract_message(extract_bytes_from_image, stego_file, password, as_bytes=True)
+            return send_file(io.BytesIO(data), mimetype="application/octet-stream", as_attachment=True,
+                             download_name="payload.bin")
+        msg = extract_message(extract_bytes_from_image, stego_file, password)
         return jsonify({"message": msg})
+    except (PoolSaturated, JobTimeoutError):
+        raise
+    except NotStegoError as e:
+        return jsonify({"error": str(e)}), 422
     except Exception as e:
         return jsonify({"error": f"Decryption failed: {e}"}), 500
 
 @app.route("/hide_audio", methods=["POST"])
 def hide_audio():
-    if "cover_audio" not in request.files or "message" not in request.form or "password" not in request.form:
+    # the secret is either a text message or an uploaded file (payload_file)
+    if ("cover_audio" not in request.files or "password" not in request.form
+            or ("message" not in request.form and "payload_file" not in request.files)):
         return jsonify({"error": "Missing required fields"}), 400
 
-    cover_audio = request.files["cover_audio"]
-    message = request.form["message"]
+    cover_audio = read_upload("cover_audio")
     password = request.form["password"]
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp:
-        cover_audio.save(temp.name)
-        temp_path = temp.name
-
-    out_path = tempfile.mktemp(suffix=".wav")
-    hide_audio_flow(temp_path, out_path, message, password)
+    try:
+        if "payload_file" in request.files:
+            stego = run_job(hide_file_job, hide_audio_file_flow, cover_audio, request.files["payload_file"].read(), password)
+        else:
+            stego = run_job(hide_message_job, hide_audio_flow, cover_audio, request.form["message"], password, form_flag("scatter"))
+    except (PoolSaturated, JobTimeoutError):
+        raise
+    except PayloadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+    except Exception as e:
+        return jsonify({"error": f"Embedding failed: {e}"}), 500
 
-    return send_file(out_path, as_attachment=True, download_name="stego.wav")
+    return send_file(io.BytesIO(stego), mimetype="audio/wav", as_attachment=True, download_name="stego.wav")
 
 @app.route("/extract_audio", methods=["POST"])
 def extract_audio():
     if "stego_audio" not in request.files or "password" not in request.form:
         return jsonify({"error": "Missing required fields"}), 400
 
-    stego_audio = request.files["stego_audio"]
+    stego_audio = read_upload("stego_audio")
     password = request.form["password"]
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp:
-        stego_audio.save(temp.name)
-        temp_path = temp.name
-
-    payload = extract_bytes_from_wav(temp_path)
     try:
-        msg = decrypt_message_from_payload(payload, password)
+        if form_flag("as_file"):
+            data = extract_message(extract_bytes_from_wav, stego_audio, password, as_bytes=True)
+            return send_file(io.BytesIO(data), mimetype="application/octet-stream", as_attachment=True,
+                             download_name="payload.bin")
+        msg = extract_message(extract_bytes_from_wav, stego_audio, password)
         return jsonify({"message": msg})
+    except (PoolSaturated, JobTimeoutError):
+        raise
+    except NotStegoError as e:
+        return jsonify({"error": str(e)}), 422
     except Exception as e:
         return jsonify({"error": f"Decryption failed: {e}"}), 500
 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for secure_steg_crypto_full.
+Generates synthetic PNG/BMP/WAV carriers (cached in --workdir, same bytes every run), times each stage
+separately (KDF, encrypt, embed, extract, decrypt) across carrier and payload sizes, records peak
+Python-heap memory and peak process RSS per stage and writes JSON results that can be compared between commits.
+Usage:
+    python benchmark.py --suite quick -o bench.json
+    python benchmark.py --suite full -o after.json --compare before.json --threshold 0.2
+With --compare, exits 1 when any stage's median time regressed by more than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+import traceback
+import tracemalloc
+import wave
+
+from PIL import Image
+
+import secure_steg_crypto_full as steg
+
+# name -> (images as (label, width, height), wavs as (label, seconds), payload sizes in bytes)
+SUITES = {
+    'quick': {
+        'images': [('thumb', 256, 256), ('1mp', 1024, 1024)],
+        'wavs': [('10s', 10), ('1min', 60)],
+        'payloads': [64, 4096],
+    },
+    'full': {
+        'images': [('thumb', 256, 256), ('1mp', 1024, 1024), ('12mp', 4000, 3000), ('50mp', 8660, 5774)],
+        'wavs': [('10s', 10), ('10min', 600), ('1h', 3600)],
+        'payloads': [64, 4096, 65536],
+    },
+}
+IMAGE_FORMATS = ('png', 'bmp')
+WAV_RATE = 44_100
+WAV_CHANNELS = 2
+WAV_SAMPWIDTH = 2
+SEED = 1234
+PASSWORD = 'benchmark-password'
+
+
+# ---------------- Synthetic carriers ----------------
+def make_image(path, width, height):
+    rng = random.Random(f'{SEED}-{width}x{height}')
+    img = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    if path.endswith('.png'):
+        img.save(path, compress_level=1)  # noise doesn't compress anyway; keep generation fast
+    else:
+        img.save(path)
+
+def make_wav(path, seconds):
+    rng = random.Random(f'{SEED}-{seconds}s')
+    frame_bytes = WAV_CHANNELS * WAV_SAMPWIDTH
+    remaining = seconds * WAV_RATE
+    with wave.open(path, 'wb') as wf:
+        wf.setnchannels(WAV_CHANNELS)
+        wf.setsampwidth(WAV_SAMPWIDTH)
+        wf.setframerate(WAV_RATE)
+        while remaining:
+            n = min(remaining, steg.WAV_CHUNK_FRAMES)
+            wf.writeframes(rng.randbytes(n * frame_bytes))
+            remaining -= n
+
+def carriers(suite, workdir):
+    """Yield (label, kind, path), generating any carrier that is not cached in workdir yet."""
+    os.makedirs(workdir, exist_ok=True)
+    for label, width, height in SUITES[suite]['images']:
+        for fmt in IMAGE_FORMATS:
+            path = os.path.join(workdir, f'{label}.{fmt}')
+            if not os.path.exists(path):
+                make_image(path, width, height)
+            yield f'{label}.{fmt}', 'image', path
+    for label, seconds in SUITES[suite]['wavs']:
+        path = os.path.join(workdir, f'{label}.wav')
+        if not os.path.exists(path):
+            make_wav(path, seconds)
+        yield f'{label}.wav', 'audio', path
+
+
+# ---------------- Measurement ----------------
+def peak_rss(fn):
+    """
+    Run fn() once in a forked child and return that process's resident-set high-water mark in bytes. Unlike
+    tracemalloc this sees Pillow, NumPy and zstd buffers allocated outside the Python heap; it also includes
+    the interpreter and everything the benchmark already holds, so compare it between runs, not to zero.
+    None where os.fork is unavailable.
+    """
+    if not hasattr(os, 'fork'):
+        return None
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn()
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    _, status, usage = os.wait4(pid, 0)
+    if os.waitstatus_to_exitcode(status):
+        raise RuntimeError('benchmark case failed in the peak-RSS child process')
+    return usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)  # bytes on macOS, KiB elsewhere
+
+def measure(fn, repeat):
+    """
+    Time fn() repeat times, then run it once more under tracemalloc for the peak Python-heap allocation and
+    once in a child process for the peak RSS (see peak_rss).
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds_min': min(times), 'seconds_median': statistics.median(times), 'peak_bytes': peak,
+            'peak_rss_bytes': peak_rss(fn)}
+
+def run_suite(suite, workdir, repeat):
+    results = []
+
+    def record(case, stage, stats, **extra):
+        results.append({'case': case, 'stage': stage, **extra, **stats})
+        rss = stats['peak_rss_bytes']
+        print(f"{case:<28} {stage:<8} median={stats['seconds_median'] * 1000:10.2f} ms  "
+              f"peak={stats['peak_bytes'] / 1e6:9.2f} MB  "
+              f"rss={'-' if rss is None else f'{rss / 1e6:.2f} MB':>10}", file=sys.stderr)
+
+    salt = os.urandom(steg.SALT_SIZE)
+    steg.disable_key_cache()
+    record('kdf', 'kdf', measure(lambda: steg.derive_fernet_key_from_password(PASSWORD, salt), repeat))
+    # with a warm key cache and a fixed salt, encrypt/decrypt time only the cipher, not PBKDF2
+    steg.enable_key_cache()
+    steg.derive_fernet_key_from_password(PASSWORD, salt)
+
+    for size in SUITES[suite]['payloads']:
+        message = ''.join(random.Random(size).choices(string.ascii_letters + ' ', k=size))
+        payload = steg.encrypt_message(message, PASSWORD, salt=salt)
+        case = f'crypto/{size}B'
+        record(case, 'encrypt', measure(lambda: steg.encrypt_message(message, PASSWORD, salt=salt), repeat),
+               payload_bytes=size)
+        record(case, 'decrypt', measure(lambda: steg.decrypt_message_from_payload(payload, PASSWORD), repeat),
+               payload_bytes=size)
+
+    for label, kind, path in carriers(suite, workdir):
+        if kind == 'image':
+            embed, extract, capacity = steg.embed_bytes_in_image, steg.extract_bytes_from_image, steg.image_capacity_bytes(path)
+        else:
+            embed, extract, capacity = steg.embed_bytes_in_wav, steg.extract_bytes_from_wav, steg.audio_capacity_bytes(path)
+        for size in SUITES[suite]['payloads']:
+            data = steg.package_payload_bytes(os.urandom(size))
+            if len(data) > capacity:
+                continue
+            case = f'{label}/{size}B'
+            extra = {'carrier': label, 'carrier_bytes': os.path.getsize(path), 'payload_bytes': size}
+            record(case, 'embed', measure(lambda: embed(path, None, data), repeat), **extra)
+            stego = embed(path, None, data)
+            record(case, 'extract', measure(lambda: extract(stego), repeat), **extra)
+    steg.disable_key_cache()
+    return results
+
+
+# ---------------- Reporting ----------------
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': getattr(steg.np, '__version__', None), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+
+def compare(results, baseline, threshold):
+    """Return [(case, stage, old, new)] for stages whose median slowed down by more than threshold."""
+    old = {(r['case'], r['stage']): r['seconds_median'] for r in baseline['results']}
+    regressions = []
+    for r in results:
+        before = old.get((r['case'], r['stage']))
+        if before and r['seconds_median'] > before * (1 + threshold):
+            regressions.append((r['case'], r['stage'], before, r['seconds_median']))
+    return regressions
+
+def build_arg_parser():
+    p = argparse.ArgumentParser(description="Benchmark KDF, crypto, embed and extract across carrier sizes")
+    p.add_argument('--suite', choices=sorted(SUITES), default='quick', help='Carrier/payload size matrix')
+    p.add_argument('--workdir', default='.bench_carriers', help='Where synthetic carriers are generated and cached')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='Timed runs per stage (median and min are reported)')
+    p.add_argument('-o', '--output', help='Write JSON results here (default: stdout)')
+    p.add_argument('--compare', help='Baseline JSON results from an earlier run')
+    p.add_argument('--threshold', type=float, default=0.2, help='Allowed median slowdown vs baseline (0.2 = 20%%)')
+    return p
+
+def main():
+    args = build_arg_parser().parse_args()
+    results = run_suite(args.suite, args.workdir, args.repeat)
+    doc = {'suite': args.suite, 'repeat': args.repeat, 'environment': environment(), 'results': results}
+    text = json.dumps(doc, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for case, stage, before, after in regressions:
+            print(f"REGRESSION {case} {stage}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -3,272 +3,1769 @@
 Secure Multimedia Data Hiding using Steganography + Cryptography
 Supports:
  - Image LSB embedding/extraction (PNG, BMP recommended)
- - Audio LSB embedding/extraction (WAV, 16-bit PCM)
-Encryption: Fernet (AES-GCM under the hood) with password-derived key (PBKDF2-HMAC-SHA256)
+ - Audio LSB embedding/extraction (WAV, 8/16/24/32-bit PCM)
+Image and audio LSB work uses vectorized NumPy engines when NumPy is installed, else pure-Python fallbacks.
+Encryption: AES-256-GCM (binary payload v2) with password-derived key (PBKDF2-HMAC-SHA256);
+legacy Fernet payloads (v1) are still decrypted.
 Usage:
     python secure_steg_crypto_full.py hide_image  -i cover.png -o stego.png  -m "secret" -p "password"
     python secure_steg_crypto_full.py extract_image -i stego.png -p "password"
-    python secure_steg_crypto_full.py hide_audio  -i cover.wav -o stego.wav  -m "secret" -p "password"
+    python secure_steg_crypto_full.py hide_audio  -i cover.wav -o stego.wav  -m "secret" -p "password" --scatter
     python secure_steg_crypto_full.py extract_audio -i stego.wav -p "password"
+    tar c docs/ | python secure_steg_crypto_full.py hide_image -i big.png -o stego.png -f - -p "password"
+    python secure_steg_crypto_full.py extract_image -i stego.png -p "password" -o docs.tar
+    python secure_steg_crypto_full.py batch_hide -i covers/ -o stego/ -m "secret" -p "password" -j 8
+    python secure_steg_crypto_full.py batch_extract -i manifest.jsonl -o messages/ -p "password" -l results.jsonl --resume
+    python secure_steg_crypto_full.py hide_shards -i a.png b.png c.wav -o shards/ -m "long secret" -p "password"
+    python secure_steg_crypto_full.py extract_shards -i shards/c.wav shards/a.png shards/b.png -p "password"
+    python secure_steg_crypto_full.py serve &   # later commands are forwarded to the warm daemon
 Notes:
- - Image must have enough pixel capacity: capacity_bytes = (num_pixels * 3) // 8
- - Audio must be 16-bit PCM WAV. capacity_bytes = (num_samples * num_channels) // 8
- - Encrypted payload format stored inside carrier: [4-byte BE length][salt(16)][ciphertext bytes]
-   The 4-byte length equals len(salt)+len(ciphertext).
+ - Image must have enough pixel capacity: capacity_bytes = 9 + ((num_pixels * 3 - 72) * k) // 8
+   (num_pixels instead of num_pixels * 3 for grayscale, 16-bit grayscale and palette covers, kept in their mode)
+ - Audio must be 8/16/24/32-bit PCM WAV. capacity_bytes = 9 + ((num_samples * num_channels - 72) * k) // 8
+ - k = LSBs per channel/sample (1-4, --bits); by default the smallest k that fits is chosen
+ - Encrypted payload format stored inside carrier: [carrier header][payload bytes]
+   carrier header: [magic 'SH'][flags: k - 1][4-byte BE length][CRC-16], written at 1 LSB; the payload
+   follows at k LSBs. Carriers without it (older: bare 4-byte length) are still read.
+   --scatter: a scatter salt follows the header and the payload bits sit at password-keyed positions.
+   v2 payload: [magic 'SG'][version][kdf id][iterations][aead id][flags][salt(16)][nonce(12)][ciphertext+tag]
+   v3 payload (--file): v2-style header + chunk size, then the file sealed in 1 MiB AES-GCM chunks.
+   v1 payload: [salt(16)][Fernet token]. The header length equals len(payload).
 """
 
-import sys, os, argparse, math, struct
-from PIL import Image
+import sys, os, io, argparse, math, struct, binascii, bisect, itertools, importlib, importlib.util
+import threading
 import wave
+
+class _LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access. The import runs under a lock, so threads
+    racing on first use (Streamlit sessions, Flask requests) all see the fully executed module, which
+    importlib's LazyLoader does not guarantee on Python 3.11 and early 3.12 releases.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, name: str):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                object.__setattr__(self, '_module', importlib.import_module(self._name))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._module or self._load(), attr, value)
+
+def _lazy_import(name: str, required: bool = True):
+    """
+    Return module name, imported only on first attribute access, so --help, audio-only commands and
+    forwarding to the daemon never pay for PIL/numpy/cryptography they don't use.
+    A missing optional package gives None; a missing required one raises ImportError right away. Only the
+    top-level package is looked up here (finding a submodule imports its parents).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name.partition('.')[0]) is None:
+        if required:
+            raise ImportError(f"No module named {name!r}")
+        return None
+    return _LazyModule(name)
+
+Image = _lazy_import('PIL.Image')
+np = _lazy_import('numpy', required=False)  # pure-Python engines are used when it is missing
 import base64
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
-from cryptography.fernet import Fernet
-from cryptography.hazmat.backends import default_backend
+import zlib, lzma
+zstandard = _lazy_import('zstandard', required=False)  # zstd is optional; zlib/lzma are always available
+pbkdf2 = _lazy_import('cryptography.hazmat.primitives.kdf.pbkdf2')
+hashes = _lazy_import('cryptography.hazmat.primitives.hashes')
+fernet = _lazy_import('cryptography.fernet')
+aead = _lazy_import('cryptography.hazmat.primitives.ciphers.aead')
+crypto_exceptions = _lazy_import('cryptography.exceptions')
 import secrets
+import hashlib, hmac, time
+import csv, json, logging, shutil, socket, socketserver, signal, stat, tempfile
+from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
 
 # ---------------- Constants ----------------
 SALT_SIZE = 16  # bytes
 KDF_ITERATIONS = 200_000
 KEY_LEN = 32  # bytes for Fernet base key before base64
-HEADER_LEN = 4  # 4-byte length prefix for payload
+KDF_MAX_ITERATIONS = 4 * KDF_ITERATIONS  # upper bound accepted from a payload header (room to raise the default)
+PAYLOAD_MAGIC = b'SG'
+PAYLOAD_VERSION = 2
+KDF_PBKDF2_SHA256 = 1  # payload header KDF ids
+AEAD_AES_GCM = 1  # payload header AEAD ids
+AEAD_CHACHA20_POLY1305 = 2
+NONCE_SIZE = 12  # bytes
+TAG_SIZE = 16  # bytes
+V2_HEADER = struct.Struct('>2sBBIBB')  # magic, version, kdf id, kdf iterations, aead id, flags
+V2_PREFIX_LEN = V2_HEADER.size + SALT_SIZE + NONCE_SIZE
+STREAM_PAYLOAD_VERSION = 3  # chunked payload for files, see Streaming payloads
+STREAM_CHUNK_SIZE = 1 << 20  # plaintext bytes per sealed chunk of a stream payload
+STREAM_NONCE_PREFIX_SIZE = 7  # random per payload; the nonce ends in the chunk index and a last-chunk flag
+STREAM_NONCE_SUFFIX = struct.Struct('>IB')  # chunk index, last-chunk flag
+STREAM_CHUNK_FIELD = struct.Struct('>I')  # plaintext chunk size, last field of the v3 header
+V3_PREFIX_LEN = V2_HEADER.size + SALT_SIZE + STREAM_NONCE_PREFIX_SIZE + STREAM_CHUNK_FIELD.size
+FLAG_COMPRESSION_MASK = 0x0F  # low bits of the v2 flags byte: compression codec id
+COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_LZMA, COMPRESSION_ZSTD = 0, 1, 2, 3
+COMPRESS_MIN_BYTES = 64  # smaller plaintexts are never worth compressing
+COMPRESS_LZMA_MIN_BYTES = 4096  # lzma's container overhead only pays off on larger inputs
+COMPRESS_PROBE_RATIO = 0.9  # zlib must reach this ratio or the data counts as incompressible
+COMPRESS_TRIAL_MAX_BYTES = 32 * 1024  # up to this size every codec is tried and the smallest output wins
+COMPRESS_SAMPLE_BYTES = 64 * 1024  # larger inputs: the zlib probe only looks at a sample this big
+COMPRESS_ZSTD_LEVEL = 9  # larger inputs are compressed once, with zstd at this level...
+COMPRESS_FAST_MIN_BYTES = 1 << 20  # ...or, from this size on,
+COMPRESS_ZSTD_FAST_LEVEL = 3  # at this level (zlib level 6 when zstandard is not installed)
+MAX_DECOMPRESSED_BYTES = 256 * 1024 * 1024  # refuse decompression bombs
+DECOMPRESS_CHUNK_BYTES = 1 << 20  # zstd output is read in pieces of at most this size, not one limit-sized buffer
+CARRIER_MAGIC = b'SH'
+CARRIER_HEADER = struct.Struct('>2sBIH')  # magic, flags, payload length, CRC-16 of the preceding fields
+HEADER_LEN = CARRIER_HEADER.size  # header written in front of the payload inside a carrier
+HEADER_BITS = HEADER_LEN * 8  # the carrier header always takes 1 LSB per channel/sample
+FLAG_BITS_MASK = 0x03  # low bits of the carrier flags byte: k - 1
+FLAG_SHARD = 0x04  # carrier payload is one shard record of a sharded payload
+FLAG_SCATTER = 0x08  # payload sits at password-keyed positions; a scatter salt follows the header
+CARRIER_FLAGS_KNOWN = FLAG_BITS_MASK | FLAG_SHARD | FLAG_SCATTER  # any other flag bit set means the header is not ours
+LEGACY_HEADER_LEN = 4  # pre-framing carriers: bare 4-byte BE length word
+LEGACY_HEADER_BITS = LEGACY_HEADER_LEN * 8
+LEGACY_LENGTH_MASK = (1 << 30) - 1  # low 30 legacy header bits: payload length; top 2 bits: k - 1
+MIN_PAYLOAD_LEN = min(V2_PREFIX_LEN, V3_PREFIX_LEN) + TAG_SIZE  # smallest payload encrypt_payload/encrypt_stream produce
+FERNET_TOKEN_PREFIX = b'gAAAAA'  # every v1 token starts with this (version byte + high timestamp bytes)
+MAX_BITS_PER_SLOT = 4  # k-LSB mode: up to 4 LSBs per channel/sample carry payload
+IMAGE_BAND_PIXELS = 1 << 20  # pixels per row band when patching image carriers
+LOSSY_IMAGE_FORMATS = ('JPEG', 'MPO')  # Pillow formats whose pixels can't hold LSBs (lossy WebP is checked apart)
+# image mode -> (channels per pixel that carry bits, NumPy dtype of the raw pixel data)
+IMAGE_LAYOUTS = {'RGB': (3, 'u1'), 'RGBA': (3, 'u1'), 'L': (1, 'u1'), 'LA': (1, 'u1'), 'P': (1, 'u1'),
+                 'I;16': (1, '<u2'), 'I;16L': (1, '<u2'), 'I;16B': (1, '>u2'), 'I': (1, '<i4')}
+WAV_CHUNK_FRAMES = 65_536  # frames per block when streaming WAV carriers
+PCM_SAMPWIDTHS = (1, 2, 3, 4)  # supported WAV sample widths in bytes
+SCATTER_ROUNDS = struct.Struct('>4Q')  # round keys of the Feistel permutation behind scattered embedding
+SCATTER_MULTIPLIER = 0x9E3779B97F4A7C15  # odd 64-bit constant mixed into each Feistel round
+SCATTER_CACHE_MAX_INDEXES = 1 << 24  # permutation index cache bound (total cached positions)
+SHARD_HEADER = struct.Struct('>16sHH32s')  # payload id, shard index, shard count, SHA-256 of the whole payload
+KEY_CACHE_MAX_ENTRIES = 256  # derived-key cache bounds (cache is opt-in)
+KEY_CACHE_TTL = 600.0  # seconds
+PAYLOAD_CACHE_MAX_BYTES = 64 * 1024 * 1024  # extracted-payload cache bounds (cache is opt-in)
+PAYLOAD_CACHE_TTL = 600.0  # seconds
+SERVE_SOCKET_ENV = 'STEG_SOCKET'  # overrides the daemon socket path
+NO_DAEMON_ENV = 'STEG_NO_DAEMON'  # set to run every command in-process even when a daemon is up
+MAX_IMAGE_PIXELS_ENV = 'STEG_MAX_IMAGE_PIXELS'  # replaces Pillow's decompression-bomb limit for carriers (0: none)
 # -------------------------------------------
 
+logger = logging.getLogger('secure_steg_crypto_full')
+
+# ---------------- Instrumentation ----------------
+# Every expensive step runs inside stage(name, **info). When it finishes, each registered hook is called as
+# hook(name, seconds, info); info carries sizes (payload_bytes, carrier_units, ...) and 'error' on failure.
+_stage_hooks = []
+
+def add_stage_hook(hook):
+    """Register hook(name, seconds, info) to be called after every instrumented stage."""
+    _stage_hooks.append(hook)
+    return hook
+
+def remove_stage_hook(hook):
+    if hook in _stage_hooks:
+        _stage_hooks.remove(hook)
+
+@contextmanager
+def stage(name: str, **info):
+    """Time the enclosed block as stage `name`; the block may add entries to the yielded info dict."""
+    start = time.perf_counter()
+    try:
+        yield info
+    except Exception as e:
+        info['error'] = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        logger.debug("stage=%s seconds=%.6f %s", name, seconds,
+                     ' '.join(f'{k}={v}' for k, v in info.items()), extra={'stage': name, 'seconds': seconds, **info})
+        for hook in list(_stage_hooks):
+            hook(name, seconds, info)
+
+# ---------------- Derived-key cache ----------------
+class DerivedKeyCache:
+    """
+    Bounded LRU cache of PBKDF2 outputs with a per-entry TTL.
+    Entries are keyed by HMAC-SHA256(process secret, password || salt || iterations), so no password
+    (nor an offline-crackable hash of one) is ever stored; the secret never leaves the process.
+    """
+
+    def __init__(self, max_entries: int = KEY_CACHE_MAX_ENTRIES, ttl: float = KEY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()  # tag -> (expires_at, derived key)
+        self._lock = threading.Lock()
+
+    def _tag(self, password_bytes: bytes, salt: bytes, iterations: int) -> bytes:
+        msg = b''.join((len(password_bytes).to_bytes(4, 'big'), password_bytes,
+                        len(salt).to_bytes(4, 'big'), salt, iterations.to_bytes(4, 'big')))
+        return hmac.new(self._secret, msg, hashlib.sha256).digest()
+
+    def get(self, password_bytes: bytes, salt: bytes, iterations: int):
+        tag = self._tag(password_bytes, salt, iterations)
+        with self._lock:
+            entry = self._entries.get(tag)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(tag)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[tag]
+            self.misses += 1
+            return None
+
+    def put(self, password_bytes: bytes, salt: bytes, iterations: int, key: bytes):
+        tag = self._tag(password_bytes, salt, iterations)
+        with self._lock:
+            self._entries[tag] = (time.monotonic() + self.ttl, key)
+            self._entries.move_to_end(tag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+_key_cache = None  # opt-in, see enable_key_cache()
+
+def enable_key_cache(max_entries: int = KEY_CACHE_MAX_ENTRIES, ttl: float = KEY_CACHE_TTL) -> DerivedKeyCache:
+    """Turn on the in-process derived-key cache. Calling it again updates the limits and keeps entries."""
+    global _key_cache
+    if _key_cache is None:
+        _key_cache = DerivedKeyCache(max_entries, ttl)
+    else:
+        _key_cache.max_entries = max_entries
+        _key_cache.ttl = ttl
+    return _key_cache
+
+def disable_key_cache():
+    """Turn off the derived-key cache and drop every cached key."""
+    global _key_cache
+    if _key_cache is not None:
+        _key_cache.clear()
+    _key_cache = None
+
+def clear_key_cache():
+    """Drop every cached key (counters are kept)."""
+    if _key_cache is not None:
+        _key_cache.clear()
+
+def key_cache_stats():
+    """Return hit/miss counters and occupancy, or None when the cache is disabled."""
+    return _key_cache.stats() if _key_cache is not None else None
+
+# ---------------- Extracted-payload cache ----------------
+# Content-addressed: entries are keyed by the extractor and the SHA-256 of the carrier bytes, and hold the
+# extracted payload, which is still ciphertext (plaintext and passwords are never stored). A re-upload of the
+# same carrier (retry, mistyped password) skips carrier decoding and only pays for decryption.
+def payload_cache_key(extract_fn, carrier: bytes) -> str:
+    return f'{extract_fn.__name__}-{hashlib.sha256(carrier).hexdigest()}'
+
+class PayloadCache:
+    """In-process LRU of extracted payloads, bounded by their total size, with a per-entry TTL."""
+
+    def __init__(self, max_bytes: int = PAYLOAD_CACHE_MAX_BYTES, ttl: float = PAYLOAD_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, payload: bytes):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            self._size += len(payload)
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        self._size -= len(self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+class DiskPayloadCache:
+    """
+    Same interface backed by a local directory, so it is shared by worker processes and survives restarts.
+    One file per entry ([8-byte expiry time][payload]), written atomically; the file mtime marks the last
+    use, and the least recently used files are removed once the directory holds more than max_bytes.
+    The directory must belong to the current user and be closed to writes by anyone else.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = PAYLOAD_CACHE_MAX_BYTES, ttl: float = PAYLOAD_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        _check_private_dir(directory, 'payload cache')
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.payload')
+
+    def _files(self) -> list:
+        """[(mtime, size, path)] of the cache files, oldest use first."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.payload'):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another process
+                files.append((st.st_mtime, st.st_size, entry.path))
+        return sorted(files)
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        if struct.unpack_from('>d', data)[0] <= time.time():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return data[8:]
+
+    def put(self, key: str, payload: bytes):
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')  # unique per writer, threads included
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(struct.pack('>d', time.time() + self.ttl) + payload)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for _, size, old in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._files():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        files = self._files()
+        return {'entries': len(files), 'bytes': sum(size for _, size, _ in files), 'max_bytes': self.max_bytes,
+                'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses, 'directory': self.directory}
+
+_payload_cache = None  # opt-in, see enable_payload_cache()
+
+def enable_payload_cache(max_bytes: int = PAYLOAD_CACHE_MAX_BYTES, ttl: float = PAYLOAD_CACHE_TTL,
+                         directory: str = None):
+    """
+    Turn on the extracted-payload cache: in-process by default, on disk under directory if given.
+    Calling it again with the same backend updates the limits and keeps entries.
+    """
+    global _payload_cache
+    if _payload_cache is None or getattr(_payload_cache, 'directory', None) != directory:
+        _payload_cache = PayloadCache(max_bytes, ttl) if directory is None else DiskPayloadCache(directory, max_bytes, ttl)
+    else:
+        _payload_cache.max_bytes = max_bytes
+        _payload_cache.ttl = ttl
+    return _payload_cache
+
+def disable_payload_cache():
+    """Turn off the payload cache; an in-process cache is emptied, an on-disk one is left in place."""
+    global _payload_cache
+    if isinstance(_payload_cache, PayloadCache):
+        _payload_cache.clear()
+    _payload_cache = None
+
+def payload_cache_stats():
+    """Return hit/miss counters and occupancy, or None when the cache is disabled."""
+    return _payload_cache.stats() if _payload_cache is not None else None
+
+def cached_extract(extract_fn, carrier: bytes, cache=None, password: str = None) -> bytes:
+    """
+    extract_fn(carrier) through the payload cache (the enabled one unless given); misses are stored.
+    password is passed on for scattered carriers; their payload is only stored once it was found, and what
+    is cached is ciphertext either way, so the key stays the carrier hash alone.
+    """
+    cache = cache if cache is not None else _payload_cache
+    if cache is None:
+        return extract_fn(carrier, password=password)
+    key = payload_cache_key(extract_fn, carrier)
+    payload = cache.get(key)
+    if payload is None:
+        payload = extract_fn(carrier, password=password)
+        cache.put(key, payload)
+    return payload
+
+# ---------------- Compression ----------------
+# v2 payloads may be compressed before encryption; the codec id lives in the low bits of the header flags byte.
+def compress_plaintext(plain: bytes) -> tuple:
+    """
+    Compress plain and return (codec id, data).
+    zlib is tried first as a cheap probe: if it can't get below COMPRESS_PROBE_RATIO the data is treated as
+    incompressible. Up to COMPRESS_TRIAL_MAX_BYTES, zstd (when installed) and lzma are tried too and the
+    smallest output wins; larger inputs are probed on a leading sample and compressed once with zstd, at a
+    level that drops as the input grows, so compression time stays well below the embed it shortens.
+    Tiny or incompressible inputs are returned as-is with COMPRESSION_NONE.
+    """
+    if len(plain) < COMPRESS_MIN_BYTES:
+        return COMPRESSION_NONE, plain
+    with stage('compress', plaintext_bytes=len(plain)) as info:
+        best = (COMPRESSION_NONE, plain)
+        if len(plain) <= COMPRESS_TRIAL_MAX_BYTES:
+            probe = zlib.compress(plain, 9)
+            if len(probe) < len(plain) * COMPRESS_PROBE_RATIO:
+                candidates = [(COMPRESSION_ZLIB, probe)]
+                if zstandard is not None:
+                    candidates.append((COMPRESSION_ZSTD, zstandard.ZstdCompressor(level=19).compress(plain)))
+                if len(plain) >= COMPRESS_LZMA_MIN_BYTES:
+                    # preset 6 with the dictionary cut to the input size: same output, without the 8 MiB
+                    # dictionary (~98 MB of working memory) the preset would allocate for a few KB of text
+                    lzma_filters = [{'id': lzma.FILTER_LZMA2, 'preset': 6, 'dict_size': max(4096, len(plain))}]
+                    candidates.append((COMPRESSION_LZMA, lzma.compress(plain, filters=lzma_filters)))
+                best = min(candidates + [best], key=lambda c: len(c[1]))
+        else:
+            sample = plain[:COMPRESS_SAMPLE_BYTES]
+            if len(zlib.compress(sample, 1)) < len(sample) * COMPRESS_PROBE_RATIO:
+                if zstandard is not None:
+                    fast = len(plain) >= COMPRESS_FAST_MIN_BYTES
+                    level = COMPRESS_ZSTD_FAST_LEVEL if fast else COMPRESS_ZSTD_LEVEL
+                    packed = (COMPRESSION_ZSTD, zstandard.ZstdCompressor(level=level).compress(plain))
+                else:
+                    packed = (COMPRESSION_ZLIB, zlib.compress(plain, 6))
+                best = min(packed, best, key=lambda c: len(c[1]))
+        info.update(codec=best[0], compressed_bytes=len(best[1]))
+    return best
+
+def decompress_plaintext(codec: int, data: bytes, limit: int = MAX_DECOMPRESSED_BYTES) -> bytes:
+    """Undo compress_plaintext, refusing to inflate past limit bytes."""
+    if codec == COMPRESSION_NONE:
+        return data
+    if codec == COMPRESSION_ZLIB:
+        d = zlib.decompressobj()
+        out = d.decompress(data, limit + 1)
+    elif codec == COMPRESSION_LZMA:
+        out = lzma.LZMADecompressor().decompress(data, max_length=limit + 1)
+    elif codec == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but the zstandard package is not installed.")
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+        chunks, size = [], 0
+        while size <= limit:
+            chunk = reader.read(min(DECOMPRESS_CHUNK_BYTES, limit + 1 - size))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+        out = b''.join(chunks)
+    else:
+        raise ValueError(f"Unknown compression id {codec} in payload header.")
+    if len(out) > limit:
+        raise ValueError(f"Decompressed payload exceeds {limit} bytes.")
+    return out
+
+# ---------------- Crypto ----------------
+# Payload v2 (default): [magic 'SG'][version=2][kdf id][kdf iterations u32][aead id][flags][salt(16)][nonce(12)][ciphertext||tag(16)]
+# Raw binary AEAD (AES-256-GCM by default); everything before the ciphertext is authenticated as associated data.
+# The flags byte carries the compression codec applied to the plaintext before encryption.
+# Payload v1 (legacy, still readable): [salt(16)][Fernet token (urlsafe base64)]
+def derive_key(password: str, salt: bytes, iterations: int = KDF_ITERATIONS) -> bytes:
+    """Derive a raw 32-byte key from password+salt with PBKDF2-HMAC-SHA256 (via the key cache when enabled)."""
+    password_bytes = password.encode('utf-8')
+    cache = _key_cache
+    with stage('kdf', iterations=iterations) as info:
+        key = cache.get(password_bytes, salt, iterations) if cache is not None else None
+        info['cached'] = key is not None
+        if key is None:
+            kdf = pbkdf2.PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=KEY_LEN,
+                salt=salt,
+                iterations=iterations,
+            )
+            key = kdf.derive(password_bytes)
+            if cache is not None:
+                cache.put(password_bytes, salt, iterations, key)
+    return key
+
 def derive_fernet_key_from_password(password: str, salt: bytes) -> bytes:
     """Derive a 32-byte key from password+salt and return a Fernet-compatible base64 key."""
-    password_bytes = password.encode('utf-8')
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=KEY_LEN,
-        salt=salt,
-        iterations=KDF_ITERATIONS,
-        backend=default_backend()
-    )
-    key = kdf.derive(password_bytes)
-    return base64.urlsafe_b64encode(key)  # Fernet expects urlsafe-base64-encoded 32-byte key
-
-def encrypt_message(message: str, password: str) -> bytes:
+    return base64.urlsafe_b64encode(derive_key(password, salt))  # Fernet expects urlsafe-base64-encoded 32-byte key
+
+def _aead(aead_id: int, key: bytes):
+    if aead_id == AEAD_AES_GCM:
+        return aead.AESGCM(key)
+    if aead_id == AEAD_CHACHA20_POLY1305:
+        return aead.ChaCha20Poly1305(key)
+    raise ValueError(f"Unknown AEAD id {aead_id} in payload header.")
+
+def encrypt_payload(plain: bytes, password: str, salt: bytes = None, version: int = PAYLOAD_VERSION,
+                    aead_id: int = AEAD_AES_GCM, compress: bool = True) -> bytes:
+    """
+    Encrypt bytes with password into a v2 payload (or a legacy v1 payload with version=1).
+    A fresh random salt is used unless one is given (batches share one to reuse the derived key).
+    With compress=True (v2 only) the plaintext is compressed first when that makes it smaller.
+    """
+    if salt is None:
+        salt = secrets.token_bytes(SALT_SIZE)
+    if version == 1:
+        f = fernet.Fernet(derive_fernet_key_from_password(password, salt))
+        with stage('encrypt', plaintext_bytes=len(plain)):
+            return salt + f.encrypt(plain)
+    codec, plain = compress_plaintext(plain) if compress else (COMPRESSION_NONE, plain)
+    header = V2_HEADER.pack(PAYLOAD_MAGIC, PAYLOAD_VERSION, KDF_PBKDF2_SHA256, KDF_ITERATIONS, aead_id, codec) + salt
+    nonce = secrets.token_bytes(NONCE_SIZE)
+    cipher = _aead(aead_id, derive_key(password, salt))
+    with stage('encrypt', plaintext_bytes=len(plain)):
+        return header + nonce + cipher.encrypt(nonce, plain, header + nonce)
+
+def _decrypt_v1(payload: bytes, password: str) -> bytes:
+    if len(payload) < SALT_SIZE + 1:
+        raise ValueError("Payload too short to contain salt + token.")
+    salt = payload[:SALT_SIZE]
+    token = payload[SALT_SIZE:]
+    f = fernet.Fernet(derive_fernet_key_from_password(password, salt))
+    with stage('decrypt', payload_bytes=len(payload)):
+        return f.decrypt(token)
+
+def _decrypt_v2(payload: bytes, password: str) -> tuple:
+    """Return (flags, plaintext as stored) for a v2 payload."""
+    _, _, kdf_id, iterations, aead_id, flags = V2_HEADER.unpack_from(payload)
+    if kdf_id != KDF_PBKDF2_SHA256:
+        raise ValueError(f"Unknown KDF id {kdf_id} in payload header.")
+    if not 1 <= iterations <= KDF_MAX_ITERATIONS:
+        raise ValueError(f"Implausible KDF iteration count {iterations} in payload header.")
+    aad = payload[:V2_PREFIX_LEN]
+    salt = aad[V2_HEADER.size:V2_HEADER.size + SALT_SIZE]
+    nonce = aad[-NONCE_SIZE:]
+    cipher = _aead(aead_id, derive_key(password, salt, iterations))
+    with stage('decrypt', payload_bytes=len(payload)):
+        return flags, cipher.decrypt(nonce, payload[V2_PREFIX_LEN:], aad)
+
+def decrypt_payload(payload: bytes, password: str) -> bytes:
+    """Decrypt a v2 (or v3 stream) payload, or a legacy v1 salt(16) || Fernet token payload, back to plaintext bytes."""
+    if payload[:3] == PAYLOAD_MAGIC + bytes([STREAM_PAYLOAD_VERSION]) and len(payload) >= V3_PREFIX_LEN + TAG_SIZE:
+        out = io.BytesIO()
+        try:
+            decrypt_stream([payload], len(payload), password, out)
+        except (crypto_exceptions.InvalidTag, ValueError):
+            if payload[SALT_SIZE:SALT_SIZE + 1] != b'g':  # same v1 salt ambiguity as below
+                raise
+        else:
+            return out.getvalue()
+    if payload[:3] == PAYLOAD_MAGIC + bytes([PAYLOAD_VERSION]) and len(payload) >= V2_PREFIX_LEN + TAG_SIZE:
+        try:
+            flags, stored = _decrypt_v2(payload, password)
+        except (crypto_exceptions.InvalidTag, ValueError):
+            # a v1 salt can start with the v2 magic by chance (p = 2**-24); its Fernet token starts with 'g'
+            if payload[SALT_SIZE:SALT_SIZE + 1] != b'g':
+                raise
+        else:
+            return decompress_plaintext(flags & FLAG_COMPRESSION_MASK, stored)
+    return _decrypt_v1(payload, password)
+
+def encrypt_message(message: str, password: str, salt: bytes = None, version: int = PAYLOAD_VERSION,
+                    compress: bool = True) -> bytes:
     """
     Encrypt message with password.
-    Returns: payload bytes = salt(16) || fernet_token(...)
+    Returns: payload bytes (v2 container by default, see above)
     We'll return payload prefixed later with length header when embedding.
     """
-    salt = secrets.token_bytes(SALT_SIZE)
-    fernet_key = derive_fernet_key_from_password(password, salt)
-    f = Fernet(fernet_key)
-    token = f.encrypt(message.encode('utf-8'))  # bytes
-    return salt + token
+    return encrypt_payload(message.encode('utf-8'), password, salt, version, compress=compress)
 
 def decrypt_message_from_payload(payload: bytes, password: str) -> str:
     """
-    payload = salt(16) || token
+    payload = v2 container, or legacy salt(16) || token
     """
-    if len(payload) < SALT_SIZE + 1:
-        raise ValueError("Payload too short to contain salt + token.")
-    salt = payload[:SALT_SIZE]
-    token = payload[SALT_SIZE:]
-    fernet_key = derive_fernet_key_from_password(password, salt)
-    f = Fernet(fernet_key)
-    plain = f.decrypt(token)
-    return plain.decode('utf-8')
+    return decrypt_payload(payload, password).decode('utf-8')
+
+# ---------------- Streaming payloads ----------------
+# Payload v3 (files of any size): [magic 'SG'][version=3][kdf id][kdf iterations u32][aead id][flags=0][salt(16)]
+# [nonce prefix(7)][chunk size u32], then the plaintext sealed chunk by chunk as ciphertext||tag(16). Chunk i
+# uses nonce prefix || i (u32 BE) || last-chunk flag and the header as associated data (the STREAM
+# construction), so reordered, dropped or truncated chunks fail authentication. Only one chunk is held at a
+# time in either direction; stream payloads are not compressed, their length follows from the file size.
+def stream_payload_length(plain_len: int, chunk_size: int = STREAM_CHUNK_SIZE) -> int:
+    """Size of the v3 payload for plain_len plaintext bytes (an empty plaintext still takes one chunk)."""
+    return V3_PREFIX_LEN + plain_len + TAG_SIZE * max(1, -(-plain_len // chunk_size))
+
+def _stream_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + STREAM_NONCE_SUFFIX.pack(index, last)
+
+def _read_exact(src, n: int) -> bytes:
+    """Read n bytes from a binary file object (fewer only at EOF), even if it returns short reads."""
+    data = src.read(n)
+    while len(data) < n:
+        more = src.read(n - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+class _ChunkReader:
+    """read(n) over an iterable of byte chunks of any size; iterating yields whatever has not been read yet."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def __iter__(self):
+        if self._buffer:
+            yield bytes(self._buffer)
+            self._buffer.clear()
+        yield from self._chunks
+
+def encrypt_stream(src, plain_len: int, password: str, salt: bytes = None, aead_id: int = AEAD_AES_GCM,
+                   chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yield the v3 payload for the next plain_len bytes of binary file object src: the header, then one sealed
+    chunk per chunk_size plaintext bytes as they are read. Raises ValueError if src ends early.
+    """
+    n_chunks = max(1, -(-plain_len // chunk_size))
+    if n_chunks > 0xFFFFFFFF:
+        raise PayloadTooLargeError(f"Input too large for a stream payload ({plain_len} bytes)")
+    if salt is None:
+        salt = secrets.token_bytes(SALT_SIZE)
+    header = (V2_HEADER.pack(PAYLOAD_MAGIC, STREAM_PAYLOAD_VERSION, KDF_PBKDF2_SHA256, KDF_ITERATIONS, aead_id,
+                             COMPRESSION_NONE)
+              + salt + secrets.token_bytes(STREAM_NONCE_PREFIX_SIZE) + STREAM_CHUNK_FIELD.pack(chunk_size))
+    prefix = header[V2_HEADER.size + SALT_SIZE:V2_HEADER.size + SALT_SIZE + STREAM_NONCE_PREFIX_SIZE]
+    cipher = _aead(aead_id, derive_key(password, salt))
+    yield header
+    remaining = plain_len
+    for index in range(n_chunks):
+        chunk = _read_exact(src, min(chunk_size, remaining))
+        if len(chunk) < min(chunk_size, remaining):
+            raise ValueError(f"Input ended {remaining - len(chunk)} bytes before its announced size")
+        remaining -= len(chunk)
+        yield cipher.encrypt(_stream_nonce(prefix, index, index == n_chunks - 1), chunk, header)
+
+def decrypt_stream(chunks, payload_len: int, password: str, out) -> int:
+    """
+    Decrypt a v3 payload of payload_len bytes that arrives as an iterable of byte chunks (any sizes), writing
+    each authenticated plaintext chunk to binary file object out. Returns the number of plaintext bytes.
+    """
+    reader = chunks if isinstance(chunks, _ChunkReader) else _ChunkReader(chunks)
+    header = reader.read(V3_PREFIX_LEN)
+    if len(header) < V3_PREFIX_LEN or payload_len < V3_PREFIX_LEN + TAG_SIZE:
+        raise ValueError("Stream payload too short")
+    magic, version, kdf_id, iterations, aead_id, _ = V2_HEADER.unpack_from(header)
+    if magic != PAYLOAD_MAGIC or version != STREAM_PAYLOAD_VERSION:
+        raise ValueError("Not a stream payload")
+    if kdf_id != KDF_PBKDF2_SHA256:
+        raise ValueError(f"Unknown KDF id {kdf_id} in payload header.")
+    if not 1 <= iterations <= KDF_MAX_ITERATIONS:
+        raise ValueError(f"Implausible KDF iteration count {iterations} in payload header.")
+    salt = header[V2_HEADER.size:V2_HEADER.size + SALT_SIZE]
+    prefix = header[V2_HEADER.size + SALT_SIZE:V2_HEADER.size + SALT_SIZE + STREAM_NONCE_PREFIX_SIZE]
+    (chunk_size,) = STREAM_CHUNK_FIELD.unpack_from(header, V3_PREFIX_LEN - STREAM_CHUNK_FIELD.size)
+    if chunk_size == 0:
+        raise ValueError("Invalid chunk size 0 in payload header.")
+    sealed_left = payload_len - V3_PREFIX_LEN
+    n_chunks = -(-sealed_left // (chunk_size + TAG_SIZE))
+    cipher = _aead(aead_id, derive_key(password, salt, iterations))
+    written = 0
+    for index in range(n_chunks):
+        sealed = reader.read(min(chunk_size + TAG_SIZE, sealed_left))
+        if len(sealed) < min(chunk_size + TAG_SIZE, sealed_left):
+            raise ValueError("Stream payload truncated")
+        sealed_left -= len(sealed)
+        plain = cipher.decrypt(_stream_nonce(prefix, index, index == n_chunks - 1), sealed, header)
+        out.write(plain)
+        written += len(plain)
+    return written
+
+# ---------------- Carrier I/O ----------------
+# Carriers can be given as a filesystem path, a binary file-like object or raw bytes.
+# Embedding writes to a path or file-like object, or returns the stego bytes when the output is None.
+def _open_source(src):
+    """Return something PIL/wave can open: paths and file objects pass through, bytes are wrapped."""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return io.BytesIO(src)
+    return src
+
+def _describe(target) -> str:
+    if isinstance(target, (str, os.PathLike)):
+        return os.fspath(target)
+    return getattr(target, 'name', '<memory>')
+
+# ---------------- Carrier header / k-LSB layout ----------------
+# The carrier header [magic 'SH'][flags][4-byte BE length][CRC-16] is always written at 1 LSB per
+# channel/sample; the low flag bits hold k - 1 and the payload follows in the next channels/samples at k LSBs
+# each (k = 1..4). Magic, checksum and a plausible length are checked on the first 72 bits, so ordinary
+# media is rejected with NotStegoError before any payload is decoded or a key derived.
+# Carriers from before the framed header start with a bare 32-bit length word (top 2 bits: k - 1); they are
+# still read, and since they carry no checksum the first payload bytes must look like a v2 or v1 payload.
+# With FLAG_SCATTER a 16-byte scatter salt follows the header (also at 1 LSB) and the payload values are spread
+# over the remaining channels/samples in a password-keyed order (see Keyed scatter below).
+class NotStegoError(ValueError):
+    """The carrier holds no payload of ours (no/invalid carrier header); raised before any decryption."""
+
+class PayloadTooLargeError(ValueError):
+    """The payload does not fit the carrier at up to MAX_BITS_PER_SLOT LSBs (or the stream/header length fields)."""
+
+def parse_carrier_header(header: bytes) -> tuple:
+    """
+    Return (bits_per_slot, payload_length, flags, header_bits) from the leading carrier bytes.
+    Framed headers are verified (checksum, unknown flags) and raise NotStegoError; bytes without the
+    magic are read as a legacy 4-byte length word.
+    """
+    if header[:len(CARRIER_MAGIC)] == CARRIER_MAGIC:
+        if len(header) < HEADER_LEN:
+            raise NotStegoError("Truncated carrier header")
+        _, flags, length, crc = CARRIER_HEADER.unpack(header[:HEADER_LEN])
+        if binascii.crc_hqx(header[:HEADER_LEN - 2], 0xFFFF) != crc:
+            raise NotStegoError("Carrier header checksum mismatch")
+        if flags & ~CARRIER_FLAGS_KNOWN:
+            raise NotStegoError(f"Unknown carrier header flags 0x{flags:02x}")
+        return (flags & FLAG_BITS_MASK) + 1, length, flags & ~FLAG_BITS_MASK, carrier_header_bits(flags)
+    word = int.from_bytes(header[:LEGACY_HEADER_LEN], byteorder='big')
+    return (word >> 30) + 1, word & LEGACY_LENGTH_MASK, 0, LEGACY_HEADER_BITS
+
+def carrier_header_bits(flags: int = 0) -> int:
+    """Leading channels/samples taken (at 1 LSB) by the carrier header, plus the scatter salt with FLAG_SCATTER."""
+    return HEADER_BITS + (SALT_SIZE * 8 if flags & FLAG_SCATTER else 0)
+
+def _looks_like_payload(prefix: bytes) -> bool:
+    """Cheap check of the first payload bytes of a legacy (checksum-less) carrier."""
+    return (prefix[:3] == PAYLOAD_MAGIC + bytes([PAYLOAD_VERSION])
+            or prefix[SALT_SIZE:SALT_SIZE + len(FERNET_TOKEN_PREFIX)] == FERNET_TOKEN_PREFIX)
+
+def _read_carrier_header(read_slots, total_slots: int, use_numpy: bool) -> tuple:
+    """
+    Validate the carrier header from the leading channels/samples before anything else is decoded.
+    read_slots(n) returns the values of the first n channels/samples. Returns what parse_carrier_header
+    returns, or raises NotStegoError for a missing header, a bad checksum or an implausible length.
+    """
+    if total_slots < LEGACY_HEADER_BITS:
+        raise NotStegoError("Carrier too small to hold a hidden payload")
+    n = min(HEADER_BITS, total_slots)
+    k, length, flags, header_bits = parse_carrier_header(_values_to_bytes(read_slots(n), 1, n // 8, use_numpy))
+    if slots_needed(length, k, header_bits) > total_slots:
+        raise NotStegoError(f"No hidden payload found (header claims {length} bytes, "
+                            f"carrier holds at most {capacity_for(total_slots, k) - HEADER_LEN})")
+    if length < (SHARD_HEADER.size + 1 if flags & FLAG_SHARD else MIN_PAYLOAD_LEN):
+        raise NotStegoError(f"No hidden payload found (header claims only {length} bytes)")
+    if header_bits == LEGACY_HEADER_BITS:
+        prefix_len = SALT_SIZE + len(FERNET_TOKEN_PREFIX)
+        values = read_slots(slots_needed(prefix_len, k, header_bits))[header_bits:]
+        if not _looks_like_payload(_values_to_bytes(values, k, prefix_len, use_numpy)):
+            raise NotStegoError("No hidden payload found (no carrier header)")
+    return k, length, flags, header_bits
+
+def _check_shard_flag(flags: int, shard: bool):
+    """Keep shard records and whole payloads apart: each needs its own extraction path."""
+    if flags & FLAG_SHARD and not shard:
+        raise ValueError("Carrier holds one shard of a sharded payload; extract all shards together (extract_shards)")
+    if shard and not flags & FLAG_SHARD:
+        raise ValueError("Carrier holds a whole payload, not a shard")
+
+def slots_needed(payload_len: int, bits_per_slot: int = 1, header_bits: int = HEADER_BITS) -> int:
+    """Channels/samples taken by the header plus payload_len bytes stored at bits_per_slot LSBs each."""
+    return header_bits + -(-payload_len * 8 // bits_per_slot)
+
+def capacity_for(n_slots: int, bits_per_slot: int = 1) -> int:
+    """Headered bytes (carrier header + payload) that fit into n_slots channels/samples."""
+    if n_slots < HEADER_BITS:
+        return 0
+    return HEADER_LEN + ((n_slots - HEADER_BITS) * bits_per_slot) // 8
+
+def plan_bits_per_slot(payload_len: int, n_slots: int, max_bits: int = MAX_BITS_PER_SLOT,
+                       header_bits: int = HEADER_BITS) -> int:
+    """Capacity planner: the smallest k (1..max_bits) at which payload_len payload bytes fit into n_slots."""
+    for k in range(1, max_bits + 1):
+        if slots_needed(payload_len, k, header_bits) <= n_slots:
+            return k
+    raise PayloadTooLargeError(f"Data too large to embed even at {max_bits} bits per channel/sample. "
+                     f"capacity={capacity_for(n_slots, max_bits)} bytes, data={HEADER_LEN + payload_len} bytes")
+
+def _keep_mask(bits_per_slot: int) -> int:
+    """Byte mask that clears the low bits_per_slot bits."""
+    return 0xFF ^ ((1 << bits_per_slot) - 1)
+
+def _payload_bits(data: bytes, use_numpy: bool):
+    """MSB-first bits of data: a uint8 array of 0/1 for NumPy, else a '0'/'1' string."""
+    if use_numpy:
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    return ''.join(f'{byte:08b}' for byte in data)
+
+def _slot_values(data: bytes, use_numpy: bool) -> tuple:
+    """
+    Split headered data into the values written to consecutive channels/samples:
+    (header values at 1 bit each, payload values at k bits each, k). The last payload value is zero-padded.
+    NumPy engine returns uint8 arrays, pure-Python engine lists of ints.
+    """
+    k, _, _, header_bits = parse_carrier_header(data)
+    bits = _payload_bits(data, use_numpy)
+    head, body = bits[:header_bits], bits[header_bits:]
+    if use_numpy:
+        return head, _bits_to_values(body, k, use_numpy), k
+    return [int(b) for b in head], _bits_to_values(body, k, use_numpy), k
+
+def _bits_to_values(bits, bits_per_slot: int, use_numpy: bool):
+    """Group MSB-first bits into bits_per_slot-bit channel/sample values, zero-padding the last one."""
+    k = bits_per_slot
+    if use_numpy:
+        if k > 1:
+            bits = np.concatenate([bits, np.zeros(-len(bits) % k, dtype=np.uint8)])
+            bits = (bits.reshape(-1, k) << np.arange(k - 1, -1, -1, dtype=np.uint8)).sum(axis=1, dtype=np.uint8)
+        return bits
+    bits += '0' * (-len(bits) % k)
+    return [int(bits[i:i + k], 2) for i in range(0, len(bits), k)]
+
+class _StreamedSlotValues:
+    """
+    Payload values of a HeaderedStream for consecutive channels/samples, converted from the payload chunks only
+    as the engines ask for them. Supports len(), iteration and slices requested front to back (the engines
+    patch carriers in order), so at most about one chunk of values is held at a time.
+    """
+
+    def __init__(self, chunks, bits_per_slot: int, count: int, use_numpy: bool):
+        self._chunks = iter(chunks)
+        self._k = bits_per_slot
+        self._count = count
+        self._use_numpy = use_numpy
+        self._pending = b''  # bytes not converted yet: k bytes always make exactly 8 values
+        self._start = 0  # index of the first buffered value
+        self._values = np.empty(0, dtype=np.uint8) if use_numpy else []
+
+    def __len__(self):
+        return self._count
+
+    def _fill(self):
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            if not self._pending:
+                raise ValueError("Payload stream ended before its announced length")
+            chunk = bytes(-len(self._pending) % self._k)  # zero-pad the last value, as _slot_values does
+        data = self._pending + chunk
+        whole = len(data) - len(data) % self._k
+        self._pending = data[whole:]
+        values = _bits_to_values(_payload_bits(data[:whole], self._use_numpy), self._k, self._use_numpy)
+        if self._use_numpy:
+            self._values = np.concatenate([self._values, values])
+        else:
+            self._values += values
+
+    def __getitem__(self, index: slice):
+        start, stop = index.start or 0, min(self._count if index.stop is None else index.stop, self._count)
+        if start < self._start:
+            raise ValueError("Streamed payload values must be read front to back")
+        while self._start + len(self._values) < stop:
+            self._fill()
+        values = self._values[start - self._start:stop - self._start]
+        self._values = self._values[stop - self._start:]
+        self._start = stop
+        return values
+
+    def __iter__(self):
+        step = 1 << 16  # values per slice for the pure-Python engine
+        for start in range(0, self._count, step):
+            yield from self[start:start + step]
+
+def _values_to_bytes(values, bits_per_slot: int, n_bytes: int, use_numpy: bool) -> bytes:
+    """Pack the low bits_per_slot bits of each channel/sample value (MSB first) into n_bytes bytes."""
+    k = bits_per_slot
+    if use_numpy:
+        values = np.asarray(values, dtype=np.uint8)
+        bits = ((values[:, None] >> np.arange(k - 1, -1, -1, dtype=np.uint8)) & 1).ravel()
+        return np.packbits(bits[:n_bytes * 8]).tobytes()
+    mask = (1 << k) - 1
+    return _bits_to_bytes(''.join(f'{v & mask:0{k}b}' for v in values)[:n_bytes * 8])
+
+def _stream_values_to_bytes(value_chunks, bits_per_slot: int, n_bytes: int, use_numpy: bool):
+    """Yield the n_bytes bytes packed from consecutive chunks of channel/sample values (see _values_to_bytes)."""
+    carry = []
+    remaining = n_bytes
+    for values in value_chunks:
+        if len(carry):
+            values = np.concatenate([carry, values]) if use_numpy else carry + values
+        whole = len(values) - len(values) % 8  # 8 values always make exactly k bytes
+        carry = values[whole:]
+        data = _values_to_bytes(values[:whole], bits_per_slot, min(remaining, whole // 8 * bits_per_slot), use_numpy)
+        remaining -= len(data)
+        if data:
+            yield data
+    if remaining > 0 and len(carry):
+        yield _values_to_bytes(carry, bits_per_slot, remaining, use_numpy)
+
+def _bits_to_bytes(bits) -> bytes:
+    """Pack MSB-first bits (uint8 array or '0'/'1' string) into bytes."""
+    if not isinstance(bits, str):
+        return np.packbits(bits).tobytes()
+    return bytes(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
+
+def _probe(src, fn):
+    """Call fn on an opened carrier; a file-like source is rewound to where it was so it can be read again."""
+    pos = src.tell() if hasattr(src, 'seek') else None
+    try:
+        return fn(_open_source(src))
+    finally:
+        if pos is not None:
+            src.seek(pos)
+
+# ---------------- Keyed scatter ----------------
+# Scattered carriers (FLAG_SCATTER) keep header and scatter salt in the leading channels/samples; payload value j
+# then goes to slot header_bits + P(j), where P is a 4-round Feistel permutation of the remaining slots
+# (cycle-walked into range). Its round keys are a subkey of the PBKDF2 key for the scatter salt, so locating
+# the payload costs a full KDF per password guess and shares the derived-key cache with decryption.
+# Only the first len(payload values) outputs of P are computed -- as array ops on the NumPy engine -- and
+# they are cached per (key, slot count), so batches with one salt over same-sized covers compute them once.
+_scatter_cache = OrderedDict()  # (key, domain, use_numpy) -> leading permutation outputs
+_scatter_cache_lock = threading.Lock()
+
+def scatter_key(password: str, salt: bytes) -> bytes:
+    """Permutation key for scattered embedding, derived from the PBKDF2 key for password + scatter salt."""
+    return hmac.new(derive_key(password, salt), b'secure_steg scatter', hashlib.sha256).digest()
+
+def _feistel(x, round_keys: tuple, half_bits: int, use_numpy: bool):
+    """One pass of the keyed Feistel permutation over [0, 4**half_bits): x is a uint64 array or an int."""
+    if use_numpy:
+        mask, shift = np.uint64((1 << half_bits) - 1), np.uint64(half_bits)
+        left, right = x >> shift, x & mask
+        for rk in round_keys:  # uint64 products wrap mod 2**64, matching the pure-Python engine
+            f = (((right ^ np.uint64(rk)) * np.uint64(SCATTER_MULTIPLIER)) >> np.uint64(32)) & mask
+            left, right = right, left ^ f
+        return (left << shift) | right
+    mask = (1 << half_bits) - 1
+    left, right = x >> half_bits, x & mask
+    for rk in round_keys:
+        f = ((((right ^ rk) * SCATTER_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> 32) & mask
+        left, right = right, left ^ f
+    return (left << half_bits) | right
+
+def _permutation_outputs(key: bytes, domain: int, start: int, stop: int, use_numpy: bool):
+    """Outputs start..stop-1 of the keyed permutation of range(domain)."""
+    round_keys = SCATTER_ROUNDS.unpack(key[:SCATTER_ROUNDS.size])
+    half_bits = max(1, ((domain - 1).bit_length() + 1) // 2)  # smallest even-split Feistel domain >= domain
+    if use_numpy:
+        out = _feistel(np.arange(start, stop, dtype=np.uint64), round_keys, half_bits, True)
+        walking = np.flatnonzero(out >= domain)
+        while len(walking):  # cycle-walk outputs past the end until they land in range
+            out[walking] = _feistel(out[walking], round_keys, half_bits, True)
+            walking = walking[out[walking] >= domain]
+        return out.astype(np.uint32 if domain <= 1 << 32 else np.uint64)
+    outputs = []
+    for i in range(start, stop):
+        y = _feistel(i, round_keys, half_bits, False)
+        while y >= domain:
+            y = _feistel(y, round_keys, half_bits, False)
+        outputs.append(y)
+    return outputs
+
+def scatter_indexes(key: bytes, domain: int, count: int, use_numpy: bool):
+    """
+    First count outputs of the keyed permutation of range(domain), through the index cache: a cached prefix
+    is sliced or extended instead of being recomputed. NumPy arrays come back read-only.
+    """
+    if count > domain:
+        raise ValueError(f"Cannot scatter {count} values over {domain} channels/samples")
+    cache_key = (key, domain, use_numpy)
+    with _scatter_cache_lock:
+        cached = _scatter_cache.get(cache_key)
+        if cached is not None:
+            _scatter_cache.move_to_end(cache_key)
+            if len(cached) >= count:
+                return cached[:count]
+    done = len(cached) if cached is not None else 0
+    more = _permutation_outputs(key, domain, done, count, use_numpy)
+    if use_numpy:
+        indexes = np.concatenate([cached, more]) if done else more
+        indexes.flags.writeable = False
+    else:
+        indexes = (cached or []) + more
+    with _scatter_cache_lock:
+        _scatter_cache[cache_key] = indexes
+        _scatter_cache.move_to_end(cache_key)
+        total = sum(len(v) for v in _scatter_cache.values())
+        while total > SCATTER_CACHE_MAX_INDEXES:
+            total -= len(_scatter_cache.popitem(last=False)[1])
+    return indexes
+
+def clear_scatter_cache():
+    with _scatter_cache_lock:
+        _scatter_cache.clear()
+
+def _scatter_plan(salt: bytes, password: str, header_bits: int, total_slots: int, count: int, use_numpy: bool) -> tuple:
+    """
+    (positions, order) for count scattered payload values: positions are ascending slot indexes and
+    payload value order[i] lives at positions[i], so carriers can be patched/read front to back.
+    """
+    if password is None:
+        raise ValueError("Carrier payload is scattered; the password is needed to locate it")
+    indexes = scatter_indexes(scatter_key(password, salt), total_slots - header_bits, count, use_numpy)
+    if use_numpy:
+        order = np.argsort(indexes, kind='stable')
+        return indexes[order].astype(np.int64) + header_bits, order
+    order = sorted(range(count), key=indexes.__getitem__)
+    return [indexes[i] + header_bits for i in order], order
+
+def _span(positions, lo: int, hi: int, use_numpy: bool) -> tuple:
+    """Index range of the ascending positions that fall into [lo, hi)."""
+    if use_numpy:
+        first, last = np.searchsorted(positions, (lo, hi))
+        return int(first), int(last)
+    return bisect.bisect_left(positions, lo), bisect.bisect_left(positions, hi)
+
+def _carrier_segments(data: bytes, n_slots: int, use_numpy: bool, password: str = None) -> tuple:
+    """
+    Lay headered data (bytes or a HeaderedStream) out over n_slots channels/samples. Returns (segments, used_slots, k); a segment is
+    (start, values, bits) for a run of consecutive slots, or (positions, values, bits) for a scattered
+    payload, with positions ascending.
+    """
+    if isinstance(data, HeaderedStream):
+        head, _, k = _slot_values(data.header, use_numpy)
+        body = _StreamedSlotValues(data.chunks, k, slots_needed(data.length, k, 0), use_numpy)
+        return [(0, head, 1), (len(head), body, k)], len(head) + len(body), k
+    head, body, k = _slot_values(data, use_numpy)
+    segments = [(0, head, 1)]
+    if not parse_carrier_header(data)[2] & FLAG_SCATTER:
+        return segments + [(len(head), body, k)], len(head) + len(body), k
+    salt = data[HEADER_LEN:HEADER_LEN + SALT_SIZE]
+    positions, order = _scatter_plan(salt, password, len(head), n_slots, len(body), use_numpy)
+    values = body[order] if use_numpy else [body[i] for i in order]
+    used = int(positions[-1]) + 1 if len(positions) else len(head)
+    return segments + [(positions, values, k)], used, k
+
+def _unscatter(gathered, order, use_numpy: bool):
+    """Put values read at ascending positions back into payload order."""
+    if use_numpy:
+        values = np.empty_like(gathered)
+        values[order] = gathered
+        return values
+    values = [0] * len(order)
+    for i, value in zip(order, gathered):
+        values[i] = value
+    return values
+
+def _read_scattered(read_slots, read_at, k: int, length: int, header_bits: int, total_slots: int,
+                    password: str, use_numpy: bool) -> bytes:
+    """
+    Payload of a scattered carrier: the scatter salt from the leading slots (read_slots(n)), then only the
+    keyed positions (read_at(ascending positions)). A wrong password lands on the wrong positions; that is
+    caught here before the bytes go anywhere (e.g. into the payload cache).
+    """
+    salt = _values_to_bytes(read_slots(header_bits), 1, header_bits // 8, use_numpy)[HEADER_LEN:]
+    positions, order = _scatter_plan(salt, password, header_bits, total_slots, slots_needed(length, k, 0), use_numpy)
+    payload = _values_to_bytes(_unscatter(read_at(positions), order, use_numpy), k, length, use_numpy)
+    if not _looks_like_payload(payload):
+        raise ValueError("No payload at the scattered positions (wrong password?)")
+    return payload
 
 # ---------------- Image LSB ----------------
-def image_capacity_bytes(image_path: str) -> int:
-    img = Image.open(image_path)
+# Carriers are used in their own mode where possible: RGB(A) carries bits in R, G and B, grayscale (L, LA and
+# 16-bit I;16) in the gray value, and palette images in the pixel index after each palette entry has been
+# duplicated 2**k times (so the hidden bits never change a colour). Palettes too large for that and any other
+# mode are converted to RGB(A) as before.
+def _image_layout(mode: str) -> tuple:
+    """(channels per pixel that carry bits, NumPy dtype of the raw pixel data) for a carrier mode."""
+    return IMAGE_LAYOUTS.get(mode, IMAGE_LAYOUTS['RGB'])
+
+def _open_image(src):
+    """
+    Image.open for carriers. Pillow refuses images above Image.MAX_IMAGE_PIXELS (about 179 MP by default) as
+    decompression bombs; STEG_MAX_IMAGE_PIXELS replaces that limit for the process when set (0 lifts it).
+    The default is kept otherwise, since the web backends open untrusted uploads.
+    """
+    limit = os.environ.get(MAX_IMAGE_PIXELS_ENV)
+    if limit:
+        Image.MAX_IMAGE_PIXELS = int(limit) or None
+    try:
+        return Image.open(src)
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"{e} Set {MAX_IMAGE_PIXELS_ENV} to allow larger carriers.") from e
+
+def image_slot_count(image_path) -> int:
+    """Number of channel values available to carry bits (read from the image header, nothing is decoded)."""
+    img = _probe(image_path, _open_image)
     width, height = img.size
-    num_pixels = width * height
-    return (num_pixels * 3) // 8  # 3 channels, 1 LSB per channel
-
-def embed_bytes_in_image(input_image: str, output_image: str, data: bytes):
-    """Embed provided bytes into LSBs of image RGB channels. Expects PIL-supported image."""
-    img = Image.open(input_image)
-    if img.mode not in ('RGB', 'RGBA'):
-        img = img.convert('RGB')
-    pixels = list(img.getdata())
-    num_pixels = len(pixels)
-    capacity = (num_pixels * 3) // 8
-    if len(data) > capacity:
-        raise ValueError(f"Data too large to embed. capacity={capacity} bytes, data={len(data)} bytes")
-    # convert data to bit string
-    bitstr = ''.join(f'{byte:08b}' for byte in data)
-    bit_iter = iter(bitstr)
-    new_pixels = []
-    used_bits = 0
-    for px in pixels:
-        r, g, b = px[:3]
-        r_bin = r & ~1
-        g_bin = g & ~1
-        b_bin = b & ~1
-        try:
-            rb = int(next(bit_iter))
-            r_new = r_bin | rb
-            used_bits += 1
-        except StopIteration:
-            r_new = r
-        try:
-            gb = int(next(bit_iter))
-            g_new = g_bin | gb
-            used_bits += 1
-        except StopIteration:
-            g_new = g
+    return width * height * _image_layout(img.mode)[0]
+
+def image_capacity_bytes(image_path, bits_per_channel: int = 1) -> int:
+    # 1 bit per channel for the header, bits_per_channel LSBs per channel for the payload
+    return capacity_for(image_slot_count(image_path), bits_per_channel)
+
+def _expand_palette(img, bits_per_slot: int):
+    """
+    Return a copy of palette image img where entry i is repeated 2**bits_per_slot times and every index is
+    shifted left by bits_per_slot, so the low index bits are free to carry data. None if the palette is too big.
+    """
+    palette = img.getpalette()
+    if palette is None or img.palette.mode != 'RGB':
+        return None
+    n_colors = len(palette) // 3
+    repeat = 1 << bits_per_slot
+    if n_colors * repeat > 256:
+        return None
+    expanded = img.point(lambda i: i << bits_per_slot)  # C pass over the indices, no per-pixel Python
+    expanded.putpalette([c for i in range(n_colors) for _ in range(repeat) for c in palette[3 * i:3 * i + 3]])
+    transparency = img.info.get('transparency')
+    if isinstance(transparency, int):
+        expanded.info['transparency'] = bytes(0 if i == transparency else 255
+                                              for i in range(n_colors) for _ in range(repeat))
+    elif isinstance(transparency, bytes):
+        alpha = transparency.ljust(n_colors, b'\xff')
+        expanded.info['transparency'] = bytes(a for a in alpha[:n_colors] for _ in range(repeat))
+    return expanded
+
+def _carrier_image(img, bits_per_slot: int):
+    """Bring a decoded cover into a mode with a slot layout, converting only when there is no other way."""
+    if img.mode == 'P':
+        expanded = _expand_palette(img, bits_per_slot)
+        if expanded is not None:
+            return expanded
+        return img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    if img.mode not in IMAGE_LAYOUTS:
+        return img.convert('RGB')
+    return img
+
+def _write_image_slots(flat, start: int, values, keep, channels: int):
+    """Vectorized masked writes of values into channel slots start.. of a (pixels, channels) view."""
+    for ch in range(channels):
+        first = start + (ch - start) % channels  # first slot at or after start that falls on this channel
+        ch_values = values[first - start::channels]  # slot s is pixel s // channels, channel s % channels
+        col = flat[first // channels:first // channels + len(ch_values), ch]
+        col &= keep
+        col |= ch_values
+
+def _embed_image_numpy(img, segments: list, used_slots: int):
+    """
+    Vectorized engine. Works through the rows that carry payload one band of about IMAGE_BAND_PIXELS pixels
+    at a time (crop, patch, paste back), so the patching needs one band on top of the decoded cover and
+    untouched rows are never copied. Channels that carry no bits (alpha) are left untouched.
+    """
+    channels, dtype = _image_layout(img.mode)
+    width = img.size[0]
+    used_pixels = -(-used_slots // channels)
+    band_rows = max(1, IMAGE_BAND_PIXELS // width)
+    for y0 in range(0, -(-used_pixels // width), band_rows):
+        band = img.crop((0, y0, width, y0 + band_rows))
+        flat = np.frombuffer(bytearray(band.tobytes()), dtype=dtype).reshape(band.size[0] * band.size[1], -1)
+        first_slot = y0 * width * channels
+        last_slot = first_slot + flat.shape[0] * channels
+        for seg_start, values, bits in segments:
+            keep = ~np.array((1 << bits) - 1, dtype=flat.dtype)
+            if not isinstance(seg_start, int):  # scattered: ascending slot positions
+                lo, hi = _span(seg_start, first_slot, last_slot, use_numpy=True)
+                if lo < hi:
+                    pixel, ch = np.divmod(seg_start[lo:hi] - first_slot, channels)
+                    flat[pixel, ch] = (flat[pixel, ch] & keep) | values[lo:hi]
+                continue
+            lo, hi = max(first_slot, seg_start), min(last_slot, seg_start + len(values))
+            if lo < hi:
+                _write_image_slots(flat, lo - first_slot, values[lo - seg_start:hi - seg_start], keep, channels)
+        band.frombytes(flat.tobytes())
+        img.paste(band, (0, y0))
+
+def _embed_image_python(img, segments: list):
+    """Pure-Python engine, used when NumPy is not installed. Only the pixels that carry bits are touched."""
+    channels = _image_layout(img.mode)[0]
+    pixels = img.load()
+    width = img.size[0]
+    for start, values, bits in segments:
+        keep = ~((1 << bits) - 1)
+        slots = range(start, start + len(values)) if isinstance(start, int) else start
+        for slot, value in zip(slots, values):
+            pixel, ch = divmod(slot, channels)
+            xy = (pixel % width, pixel // width)
+            px = pixels[xy]
+            if isinstance(px, tuple):
+                px = list(px)  # alpha (if any) is kept as is
+                px[ch] = (px[ch] & keep) | value
+                pixels[xy] = tuple(px)
+            else:
+                pixels[xy] = (px & keep) | value
+
+def embed_bytes_in_image(input_image, output_image, data: bytes, use_numpy: bool = None, image_format: str = None,
+                         password: str = None):
+    """
+    Embed provided bytes into LSBs of image channels (RGB, gray value or palette index). Expects PIL-supported image.
+    data is headered (see package_payload_bytes); the header's k decides how many LSBs per channel carry payload.
+    A HeaderedStream (package_payload_stream) is consumed band by band instead of being held whole.
+    The cover itself is decoded whole (and re-encoded whole on save), so memory grows with the cover's pixel
+    count; covers above Pillow's decompression-bomb limit need STEG_MAX_IMAGE_PIXELS (see _open_image).
+    A scattered header (FLAG_SCATTER) needs the password that keys the payload positions.
+    use_numpy=None picks the NumPy engine when available; both engines produce identical output.
+    output_image may be a path, a file-like object (saved as image_format, default PNG) or None
+    to get the stego image back as bytes.
+    """
+    k, _, _, header_bits = parse_carrier_header(_header_of(data))
+    with stage('image_decode') as info:
+        img = _open_image(_open_source(input_image))
+        img.load()
+        img = _carrier_image(img, k)
+        width, height = img.size
+        info['carrier_units'] = width * height
+    n_slots = width * height * _image_layout(img.mode)[0]
+    if slots_needed(len(data) - header_bits // 8, k, header_bits) > n_slots:
+        raise PayloadTooLargeError(f"Data too large to embed. capacity={capacity_for(n_slots, k)} bytes, data={len(data)} bytes")
+    if use_numpy is None:
+        use_numpy = np is not None
+    with stage('image_embed', payload_bytes=len(data), carrier_units=width * height, bits_per_slot=k):
+        segments, used_slots, _ = _carrier_segments(data, n_slots, use_numpy, password)
+        if use_numpy:
+            _embed_image_numpy(img, segments, used_slots)
+        else:
+            _embed_image_python(img, segments)
+    with stage('image_encode', carrier_units=width * height):
+        if output_image is None:
+            buf = io.BytesIO()
+            img.save(buf, format=image_format or 'PNG')
+        elif isinstance(output_image, (str, os.PathLike)):
+            img.save(output_image, format=image_format)
+        else:
+            img.save(output_image, format=image_format or 'PNG')
+    logger.info("Embedded %d bytes into %s", len(data), _describe(output_image if output_image is not None else buf),
+                extra={'payload_bytes': len(data), 'carrier_units': width * height, 'bits_per_slot': k})
+    if output_image is None:
+        return buf.getvalue()
+
+def _limit_rows(img, rows: int) -> bool:
+    """
+    Cut the decoder of an opened, not yet loaded image down to its first rows rows. Only single-tile PNG
+    (not interlaced) and uncompressed BMP files qualify; anything else returns False and is left untouched.
+    """
+    if len(img.tile) != 1 or img.format not in ('PNG', 'BMP') or img.info.get('interlace'):
+        return False
+    decoder, extents, offset, args = img.tile[0]
+    width, height = img.size
+    if tuple(extents) != (0, 0, width, height):
+        return False
+    if decoder == 'raw' and isinstance(args, tuple) and len(args) == 3:
+        if args[2] < 0:  # bottom-up BMP: the top rows are stored last
+            offset += (height - rows) * args[1]
+    elif decoder != 'zip':
+        return False
+    img.tile = [(decoder, (0, 0, width, rows), offset, args)]
+    img._size = (width, rows)
+    if img.format == 'PNG':
+        img.load_end = lambda: None  # the rest of the IDAT data and any trailing chunks are never needed
+    return True
+
+def _webp_is_lossy(fp) -> bool:
+    """Whether a WebP stream (positioned at its RIFF header) holds VP8 (lossy) image data; reads chunk headers only."""
+    fp.seek(12, io.SEEK_CUR)
+    while len(chunk := fp.read(8)) == 8:
+        fourcc, size = chunk[:4], int.from_bytes(chunk[4:], 'little')
+        if fourcc in (b'VP8 ', b'ALPH'):  # an alpha chunk only accompanies lossy data
+            return True
+        if fourcc in (b'VP8L', b'ANIM'):  # lossless, or animated (frames may mix both): let the header decide
+            return False
+        fp.seek(size + (size & 1), io.SEEK_CUR)
+    return False
+
+class _ImageRows:
+    """
+    Row access to an image carrier for extraction that decodes no further down than the rows asked for, so
+    reading the header or a short payload costs a few rows, not the whole image. When a later call reaches
+    past the decoded rows the source is opened again and decoded further (at least twice as far). Formats
+    _limit_rows can't cut, and file objects that can't be re-read, are decoded whole on first use. Lossy
+    formats (JPEG, lossy WebP) are rejected with NotStegoError before anything is decoded.
+    """
+
+    def __init__(self, src):
+        self._src = src
+        self._pos = src.tell() if hasattr(src, 'seekable') and src.seekable() else None
+        self._reopen = self._pos is not None or isinstance(src, (bytes, bytearray, memoryview, str, os.PathLike))
+        self._img = _open_image(_open_source(src))
+        if self._img.format in LOSSY_IMAGE_FORMATS or self._img.format == 'WEBP' and self._lossy_webp():
+            raise NotStegoError(f'{self._img.format} images are lossy and cannot carry a payload')
+        self.size = self._img.size
+        self.mode = self._img.mode if self._img.mode in IMAGE_LAYOUTS else 'RGB'
+        self._rows = 0  # rows decoded so far
+
+    def _lossy_webp(self) -> bool:
+        fp = self._img.fp  # Pillow keeps it open (a non-seekable source is buffered from its current position)
+        fp.seek(self._pos or 0)
         try:
-            bb = int(next(bit_iter))
-            b_new = b_bin | bb
-            used_bits += 1
-        except StopIteration:
-            b_new = b
-        if len(px) == 4:
-            # keep alpha channel unchanged
-            new_pixels.append((r_new, g_new, b_new, px[3]))
+            return _webp_is_lossy(fp)
+        finally:
+            fp.seek(self._pos or 0)
+
+    def band(self, y0: int, y1: int):
+        """Rows y0..y1-1 as an image in self.mode."""
+        if y1 > self._rows:
+            self._decode(y1)
+        band = self._img.crop((0, y0, self.size[0], y1))
+        return band if band.mode == self.mode else band.convert(self.mode)
+
+    def _decode(self, rows: int):
+        img = self._img
+        if self._rows:  # this image is loaded already: start over from the source
+            if self._pos is not None:
+                self._src.seek(self._pos)
+            img = _open_image(_open_source(self._src))
+        rows = min(self.size[1], max(rows, 2 * self._rows))
+        if not self._reopen or not _limit_rows(img, rows):
+            rows = self.size[1]
+        img.load()
+        self._img, self._rows = img, rows
+
+def _image_slots(img, n_slots: int, use_numpy: bool):
+    """
+    Return the first n_slots channel values of an _ImageRows carrier, decoding only the leading rows that hold them.
+    NumPy engine returns a uint8 array (low byte of each value), pure-Python engine a list of ints.
+    """
+    channels, dtype = _image_layout(img.mode)
+    width, height = img.size
+    n_pixels = -(-n_slots // channels)
+    rows = min(height, -(-n_pixels // width))
+    band = img.band(0, rows)
+    if use_numpy:
+        flat = np.frombuffer(band.tobytes(), dtype=dtype).reshape(width * rows, -1)
+        return flat[:n_pixels, :channels].ravel()[:n_slots].astype(np.uint8)
+    values = []
+    for px in list(band.getdata())[:n_pixels]:
+        if isinstance(px, tuple):
+            values.extend(px[:channels])
         else:
-            new_pixels.append((r_new, g_new, b_new))
-        if used_bits >= len(bitstr):
-            # copy remaining pixels unchanged
-            idx = len(new_pixels)
-            new_pixels.extend(pixels[idx:])
-            break
-    img.putdata(new_pixels)
-    img.save(output_image)
-    print(f"✅ Embedded {len(data)} bytes into {output_image}")
-
-def extract_bytes_from_image(stego_image: str, expected_total_bytes: int = None) -> bytes:
-    """
-    Extract bytes from image LSBs. If expected_total_bytes is None we will first read a 4-byte header.
-    Format inside image: [4-byte BE length][payload bytes]
-    So function returns payload bytes (salt+token) without the initial 4-byte header.
-    """
-    img = Image.open(stego_image)
-    if img.mode not in ('RGB', 'RGBA'):
-        img = img.convert('RGB')
-    pixels = list(img.getdata())
-    bits = []
-    for px in pixels:
-        for ch in px[:3]:
-            bits.append(str(ch & 1))
-    bitstr = ''.join(bits)
-    # helper to convert bits to bytes
-    def bits_to_bytes(bstr):
-        return bytes(int(bstr[i:i+8], 2) for i in range(0, len(bstr), 8))
-    # first read header 4 bytes -> 32 bits
-    if len(bitstr) < 32:
-        raise ValueError("Image too small / no data.")
-    header_bits = bitstr[:32]
-    length = int(header_bits, 2)  # number of payload bytes
-    total_bits_needed = 32 + (length * 8)
-    if len(bitstr) < total_bits_needed:
-        raise ValueError("Image does not contain full payload (expected length mismatch).")
-    payload_bits = bitstr[32:32 + length*8]
-    payload = bits_to_bytes(payload_bits)
-    return payload  # payload bytes (salt+token)
+            values.append(px)
+    return values[:n_slots]
+
+def _image_slots_at(img, positions, use_numpy: bool):
+    """Channel values at ascending slot positions, decoding one row band at a time (same values as _image_slots)."""
+    channels, dtype = _image_layout(img.mode)
+    width, height = img.size
+    if not use_numpy:
+        pixels = img.band(0, positions[-1] // channels // width + 1).load() if positions else None
+        values = []
+        for slot in positions:
+            pixel, ch = divmod(slot, channels)
+            px = pixels[pixel % width, pixel // width]
+            values.append(px[ch] if isinstance(px, tuple) else px)
+        return values
+    values = np.empty(len(positions), dtype=np.uint8)
+    band_rows = max(1, IMAGE_BAND_PIXELS // width)
+    rows = int(positions[-1]) // channels // width + 1 if len(positions) else 0
+    for y0 in range(0, rows, band_rows):
+        first_slot = y0 * width * channels
+        lo, hi = _span(positions, first_slot, first_slot + band_rows * width * channels, use_numpy=True)
+        if lo < hi:
+            band = img.band(y0, min(height, y0 + band_rows))
+            flat = np.frombuffer(band.tobytes(), dtype=dtype).reshape(band.size[0] * band.size[1], -1)
+            pixel, ch = np.divmod(positions[lo:hi] - first_slot, channels)
+            values[lo:hi] = flat[pixel, ch].astype(np.uint8)
+    return values
+
+def _iter_image_slots(img, start: int, stop: int, use_numpy: bool):
+    """Yield the values of channel slots start..stop-1 one row band at a time (same values as _image_slots)."""
+    channels, dtype = _image_layout(img.mode)
+    width, height = img.size
+    row_slots = width * channels
+    band_rows = max(1, IMAGE_BAND_PIXELS // width)
+    last_row = min(height, -(-stop // row_slots))
+    for y0 in range(start // row_slots, last_row, band_rows):
+        band = img.band(y0, min(last_row, y0 + band_rows))
+        first_slot = y0 * row_slots
+        lo, hi = max(start, first_slot) - first_slot, min(stop, first_slot + band.size[1] * row_slots) - first_slot
+        if use_numpy:
+            flat = np.frombuffer(band.tobytes(), dtype=dtype).reshape(band.size[0] * band.size[1], -1)
+            yield flat[:, :channels].ravel()[lo:hi].astype(np.uint8)
+            continue
+        values = []
+        for px in band.getdata():
+            if isinstance(px, tuple):
+                values.extend(px[:channels])
+            else:
+                values.append(px)
+        yield values[lo:hi]
+
+def stream_bytes_from_image(stego_image, use_numpy: bool = None, password: str = None) -> tuple:
+    """
+    Streaming extract_bytes_from_image for large payloads: returns (payload length, iterator of payload byte
+    chunks). The header is checked up front; the payload rows are decoded one band at a time as the iterator
+    is consumed. Scattered payloads come back as one chunk (they are only ever written from memory).
+    """
+    img = _ImageRows(stego_image)
+    if use_numpy is None:
+        use_numpy = np is not None
+    width, height = img.size
+    total_slots = width * height * _image_layout(img.mode)[0]
+    k, length, flags, header_bits = _read_carrier_header(lambda n: _image_slots(img, n, use_numpy),
+                                                         total_slots, use_numpy)
+    _check_shard_flag(flags, False)
+    if flags & FLAG_SCATTER:
+        return length, iter([_read_scattered(lambda n: _image_slots(img, n, use_numpy),
+                                             lambda positions: _image_slots_at(img, positions, use_numpy),
+                                             k, length, header_bits, total_slots, password, use_numpy)])
+    values = _iter_image_slots(img, header_bits, slots_needed(length, k, header_bits), use_numpy)
+    return length, _stream_values_to_bytes(values, k, length, use_numpy)
+
+def extract_bytes_from_image(stego_image, expected_total_bytes: int = None, use_numpy: bool = None,
+                             shard: bool = False, password: str = None) -> bytes:
+    """
+    Extract bytes from image LSBs. If expected_total_bytes is None we will first read the carrier header.
+    Format inside image: [carrier header][payload bytes]
+    So function returns payload bytes (salt+token) without the carrier header.
+    Only the header bits and the rows holding the payload are decoded; k comes from the header.
+    Raises NotStegoError as soon as the header shows the image carries no payload.
+    shard=True expects (and returns) a shard record instead of a whole payload.
+    A scattered payload is read from the positions keyed by password (only those are read).
+    """
+    img = _ImageRows(stego_image)
+    if use_numpy is None:
+        use_numpy = np is not None
+    width, height = img.size
+    total_slots = width * height * _image_layout(img.mode)[0]
+    with stage('image_extract', carrier_units=width * height) as info:
+        # header first: magic, checksum and length are checked before the payload rows are decoded
+        k, length, flags, header_bits = _read_carrier_header(lambda n: _image_slots(img, n, use_numpy),
+                                                             total_slots, use_numpy)
+        _check_shard_flag(flags, shard)
+        info['payload_bytes'] = length
+        info['bits_per_slot'] = k
+        if flags & FLAG_SCATTER:
+            return _read_scattered(lambda n: _image_slots(img, n, use_numpy),
+                                   lambda positions: _image_slots_at(img, positions, use_numpy),
+                                   k, length, header_bits, total_slots, password, use_numpy)
+        values = _image_slots(img, slots_needed(length, k, header_bits), use_numpy)
+    return _values_to_bytes(values[header_bits:], k, length, use_numpy)  # payload bytes (salt+token)
 
 # ---------------- Audio LSB ----------------
-def audio_capacity_bytes(wav_path: str) -> int:
-    with wave.open(wav_path, 'rb') as wf:
-        n_frames = wf.getnframes()
-        n_channels = wf.getnchannels()
-        # we will use 1 LSB per sample per channel
-        return (n_frames * n_channels) // 8
+def audio_slot_count(wav_path) -> int:
+    """Number of samples (all channels) available to carry bits."""
+    def count(src):
+        with wave.open(src, 'rb') as wf:
+            return wf.getnframes() * wf.getnchannels()
+    return _probe(wav_path, count)
+
+def audio_capacity_bytes(wav_path, bits_per_sample: int = 1) -> int:
+    # 1 bit per sample for the header, bits_per_sample LSBs per sample for the payload
+    return capacity_for(audio_slot_count(wav_path), bits_per_sample)
+
+def _check_sampwidth(sampwidth: int):
+    if sampwidth not in PCM_SAMPWIDTHS:
+        raise ValueError(f"Only 8/16/24/32-bit PCM WAV files supported (sampwidth={sampwidth}).")
 
-def embed_bytes_in_wav(input_wav: str, output_wav: str, data: bytes):
+def _patch_pcm_slots(buf: bytearray, sampwidth: int, first: int, values, keep: int, use_numpy: bool):
     """
-    Embed data bytes into LSB of 16-bit PCM WAV samples.
-    We store [4-byte BE length][payload bytes] as with image.
+    Write values into the low bits of samples first..first+len(values) of a raw little-endian PCM buffer,
+    in place. The low bits of every sample live in every sampwidth-th byte, so no sample is unpacked.
     """
-    with wave.open(input_wav, 'rb') as wf:
-        params = wf.getparams()
+    if use_numpy:
+        low = np.frombuffer(buf, dtype=np.uint8)[first * sampwidth::sampwidth][:len(values)]
+        low &= keep
+        low |= values
+        return
+    for i, value in enumerate(values):
+        pos = (first + i) * sampwidth
+        buf[pos] = (buf[pos] & keep) | value
+
+def _patch_pcm_at(buf: bytearray, sampwidth: int, offsets, values, keep: int, use_numpy: bool):
+    """Like _patch_pcm_slots, for the samples at the given (ascending) offsets into the buffer."""
+    if use_numpy:
+        low = np.frombuffer(buf, dtype=np.uint8)
+        idx = offsets * sampwidth
+        low[idx] = (low[idx] & keep) | values
+        return
+    for offset, value in zip(offsets, values):
+        pos = offset * sampwidth
+        buf[pos] = (buf[pos] & keep) | value
+
+def _pcm_low_bytes(buf: bytes, sampwidth: int, n_samples: int, use_numpy: bool):
+    """Read the low byte of the first n_samples samples of a raw little-endian PCM buffer."""
+    if use_numpy:
+        return np.frombuffer(buf, dtype=np.uint8)[::sampwidth][:n_samples]
+    return list(buf[:n_samples * sampwidth:sampwidth])
+
+def embed_bytes_in_wav(input_wav, output_wav, data: bytes, chunk_frames: int = WAV_CHUNK_FRAMES,
+                       use_numpy: bool = None, password: str = None):
+    """
+    Embed data bytes into LSB of 8/16/24/32-bit PCM WAV samples.
+    We store [carrier header][payload bytes] as with image; the header's k decides how many LSBs
+    per sample carry payload. A scattered header (FLAG_SCATTER) needs the password that keys the positions.
+    A HeaderedStream (package_payload_stream) is consumed block by block instead of being held whole.
+    The carrier is streamed in blocks of chunk_frames frames: only blocks that carry payload bits
+    are patched (in place on the raw bytes), the rest are copied straight through, so memory is
+    bounded by the block size.
+    output_wav may be a path, a file-like object or None to get the stego WAV back as bytes.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    out = io.BytesIO() if output_wav is None else output_wav
+    with wave.open(_open_source(input_wav), 'rb') as wf_in:
+        params = wf_in.getparams()
         n_channels = params.nchannels
         sampwidth = params.sampwidth
-        if sampwidth != 2:
-            raise ValueError("Only 16-bit PCM WAV files supported (sampwidth=2).")
-        n_frames = wf.getnframes()
-        frames = wf.readframes(n_frames)
-    # unpack samples
-    total_samples = n_frames * n_channels
-    fmt = '<' + 'h' * total_samples  # little-endian signed 16-bit
-    samples = list(struct.unpack(fmt, frames))
-    capacity = (total_samples) // 8
-    if len(data) > capacity:
-        raise ValueError(f"Data too large to embed in audio. capacity={capacity} bytes, data={len(data)} bytes")
-    # build bitstring
-    bitstr = ''.join(f'{byte:08b}' for byte in data)
-    bit_iter = iter(bitstr)
-    new_samples = []
-    used_bits = 0
-    for s in samples:
-        try:
-            b = next(bit_iter)
-            # set LSB to bit b
-            if b == '1':
-                s_new = s | 1
-            else:
-                s_new = s & ~1
-            used_bits += 1
-        except StopIteration:
-            s_new = s
-        new_samples.append(s_new)
-        if used_bits >= len(bitstr):
-            # append remaining samples unchanged
-            idx = len(new_samples)
-            new_samples.extend(samples[idx:])
+        _check_sampwidth(sampwidth)
+        total_samples = params.nframes * n_channels
+        k, _, _, header_bits = parse_carrier_header(_header_of(data))
+        if slots_needed(len(data) - header_bits // 8, k, header_bits) > total_samples:
+            raise PayloadTooLargeError(f"Data too large to embed in audio. "
+                                       f"capacity={capacity_for(total_samples, k)} bytes, data={len(data)} bytes")
+        segments, used_samples, k = _carrier_segments(data, total_samples, use_numpy, password)
+        pos = 0  # index of the first sample in the current block
+        with stage('audio_embed', payload_bytes=len(data), carrier_units=total_samples, bits_per_slot=k), \
+                wave.open(out, 'wb') as wf_out:
+            wf_out.setparams(params)
+            while True:
+                frames = wf_in.readframes(chunk_frames)
+                if not frames:
+                    break
+                n = len(frames) // sampwidth
+                if pos < used_samples:
+                    frames = bytearray(frames)
+                    for seg_start, values, bits in segments:
+                        if not isinstance(seg_start, int):  # scattered: ascending sample positions
+                            lo, hi = _span(seg_start, pos, pos + n, use_numpy)
+                            offsets = (seg_start[lo:hi] - pos if use_numpy
+                                       else [slot - pos for slot in seg_start[lo:hi]])
+                            _patch_pcm_at(frames, sampwidth, offsets, values[lo:hi], _keep_mask(bits), use_numpy)
+                            continue
+                        lo, hi = max(pos, seg_start), min(pos + n, seg_start + len(values))
+                        if lo < hi:
+                            _patch_pcm_slots(frames, sampwidth, lo - pos, values[lo - seg_start:hi - seg_start],
+                                             _keep_mask(bits), use_numpy)
+                pos += n
+                wf_out.writeframesraw(frames)
+    logger.info("Embedded %d bytes into %s", len(data), _describe(out),
+                extra={'payload_bytes': len(data), 'carrier_units': total_samples, 'bits_per_slot': k})
+    if output_wav is None:
+        return out.getvalue()
+
+def _read_wav_slots(wf, n_samples: int, use_numpy: bool):
+    """Read just enough frames from an open wave reader to return the low bytes of the next n_samples samples."""
+    n_frames = -(-n_samples // wf.getnchannels())
+    return _pcm_low_bytes(wf.readframes(n_frames), wf.getsampwidth(), n_samples, use_numpy)
+
+def _wav_slots_at(wf, positions, use_numpy: bool, chunk_frames: int = WAV_CHUNK_FRAMES):
+    """Low bytes of the samples at ascending positions, streaming blocks up to the last one needed."""
+    wf.rewind()
+    sampwidth = wf.getsampwidth()
+    values = np.empty(len(positions), dtype=np.uint8) if use_numpy else []
+    pos = 0
+    done = 0
+    while done < len(positions):
+        frames = wf.readframes(chunk_frames)
+        if not frames:
+            break
+        n = len(frames) // sampwidth
+        lo, done = _span(positions, pos, pos + n, use_numpy)
+        if use_numpy:
+            values[lo:done] = np.frombuffer(frames, dtype=np.uint8)[(positions[lo:done] - pos) * sampwidth]
+        else:
+            values.extend(frames[(slot - pos) * sampwidth] for slot in positions[lo:done])
+        pos += n
+    return values
+
+def _iter_wav_slots(wf, start: int, stop: int, use_numpy: bool, chunk_frames: int = WAV_CHUNK_FRAMES):
+    """Yield the low bytes of samples start..stop-1 of an open wave reader, one block of frames at a time."""
+    n_channels, sampwidth = wf.getnchannels(), wf.getsampwidth()
+    wf.setpos(start // n_channels)
+    pos = start - start % n_channels  # index of the first sample in the current block
+    while pos < stop:
+        frames = wf.readframes(chunk_frames)
+        if not frames:
             break
-    new_frames = struct.pack(fmt, *new_samples)
-    with wave.open(output_wav, 'wb') as wf:
-        wf.setparams(params)
-        wf.writeframes(new_frames)
-    print(f"✅ Embedded {len(data)} bytes into {output_wav}")
+        n = len(frames) // sampwidth
+        yield _pcm_low_bytes(frames, sampwidth, n, use_numpy)[max(start - pos, 0):stop - pos]
+        pos += n
+
+def stream_bytes_from_wav(stego_wav, use_numpy: bool = None, password: str = None) -> tuple:
+    """
+    Streaming extract_bytes_from_wav for large payloads: returns (payload length, iterator of payload byte
+    chunks), reading one block of frames at a time as the iterator is consumed (the WAV is closed at the end).
+    Scattered payloads come back as one chunk (they are only ever written from memory).
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    wf = wave.open(_open_source(stego_wav), 'rb')
+    try:
+        _check_sampwidth(wf.getsampwidth())
+        total_samples = wf.getnframes() * wf.getnchannels()
+
+        def read_slots(n):
+            wf.rewind()
+            return _read_wav_slots(wf, n, use_numpy)
+        k, length, flags, header_bits = _read_carrier_header(read_slots, total_samples, use_numpy)
+        _check_shard_flag(flags, False)
+        if flags & FLAG_SCATTER:
+            payload = _read_scattered(read_slots, lambda positions: _wav_slots_at(wf, positions, use_numpy),
+                                      k, length, header_bits, total_samples, password, use_numpy)
+            wf.close()
+            return length, iter([payload])
+    except BaseException:
+        wf.close()
+        raise
 
-def extract_bytes_from_wav(stego_wav: str) -> bytes:
+    def chunks():
+        with wf:
+            values = _iter_wav_slots(wf, header_bits, slots_needed(length, k, header_bits), use_numpy)
+            yield from _stream_values_to_bytes(values, k, length, use_numpy)
+    return length, chunks()
+
+def extract_bytes_from_wav(stego_wav, use_numpy: bool = None, shard: bool = False, password: str = None) -> bytes:
     """
-    Extract payload stored: [4-byte BE length][payload bytes] -> return payload bytes
+    Extract payload stored: [carrier header][payload bytes] -> return payload bytes
+    Only the leading frames that hold the header and payload are read; k comes from the header.
+    Raises NotStegoError as soon as the header shows the WAV carries no payload.
+    shard=True expects (and returns) a shard record instead of a whole payload.
+    A scattered payload is read from the positions keyed by password (only those samples are kept).
     """
-    with wave.open(stego_wav, 'rb') as wf:
+    if use_numpy is None:
+        use_numpy = np is not None
+    with wave.open(_open_source(stego_wav), 'rb') as wf:
         params = wf.getparams()
         n_channels = params.nchannels
-        sampwidth = params.sampwidth
-        if sampwidth != 2:
-            raise ValueError("Only 16-bit PCM WAV files supported (sampwidth=2).")
-        n_frames = wf.getnframes()
-        frames = wf.readframes(n_frames)
-    total_samples = n_frames * n_channels
-    fmt = '<' + 'h' * total_samples
-    samples = list(struct.unpack(fmt, frames))
-    bits = ''.join(str(s & 1) for s in samples)
-    # read 32-bit header
-    if len(bits) < 32:
-        raise ValueError("WAV too small or no data.")
-    header_bits = bits[:32]
-    length = int(header_bits, 2)
-    total_needed = 32 + (length * 8)
-    if len(bits) < total_needed:
-        raise ValueError("Audio does not contain full payload (expected length mismatch).")
-    payload_bits = bits[32:32 + length*8]
-    payload = bytes(int(payload_bits[i:i+8], 2) for i in range(0, len(payload_bits), 8))
-    return payload
+        _check_sampwidth(params.sampwidth)
+        total_samples = wf.getnframes() * n_channels
+        with stage('audio_extract', carrier_units=total_samples) as info:
+            # header first: magic, checksum and length are checked before the payload frames are read
+            def read_slots(n):
+                wf.rewind()
+                return _read_wav_slots(wf, n, use_numpy)
+            k, length, flags, header_bits = _read_carrier_header(read_slots, total_samples, use_numpy)
+            _check_shard_flag(flags, shard)
+            info['payload_bytes'] = length
+            info['bits_per_slot'] = k
+            if flags & FLAG_SCATTER:
+                return _read_scattered(read_slots, lambda positions: _wav_slots_at(wf, positions, use_numpy),
+                                       k, length, header_bits, total_samples, password, use_numpy)
+            values = read_slots(slots_needed(length, k, header_bits))[header_bits:]
+    return _values_to_bytes(values, k, length, use_numpy)
 
 # ---------------- Helpers to package/unpackage payloads ----------------
-def package_payload_bytes(payload: bytes) -> bytes:
-    """Return 4-byte length header + payload bytes"""
-    length = len(payload)
-    header = length.to_bytes(HEADER_LEN, byteorder='big')
-    return header + payload
+def _carrier_header(length: int, bits_per_slot: int, flags: int) -> bytes:
+    """Carrier header (magic, flags with bits_per_slot, length, CRC-16) for a payload of length bytes."""
+    if length > 0xFFFFFFFF:
+        raise PayloadTooLargeError(f"Payload too large for the carrier header ({length} bytes)")
+    if not 1 <= bits_per_slot <= MAX_BITS_PER_SLOT:
+        raise ValueError(f"bits per channel/sample must be 1..{MAX_BITS_PER_SLOT}, got {bits_per_slot}")
+    fields = CARRIER_HEADER.pack(CARRIER_MAGIC, flags | (bits_per_slot - 1), length, 0)[:HEADER_LEN - 2]
+    return fields + binascii.crc_hqx(fields, 0xFFFF).to_bytes(2, byteorder='big')
+
+def package_payload_bytes(payload: bytes, bits_per_slot: int = 1, flags: int = 0, scatter_salt: bytes = None) -> bytes:
+    """
+    Return carrier header (magic, flags with bits_per_slot, length, CRC-16) + payload bytes.
+    With FLAG_SCATTER in flags the scatter salt goes between header and payload.
+    """
+    if flags & FLAG_SCATTER and (scatter_salt is None or len(scatter_salt) != SALT_SIZE):
+        raise ValueError(f"Scattered embedding needs a {SALT_SIZE}-byte scatter salt")
+    header = _carrier_header(len(payload), bits_per_slot, flags)
+    return header + (scatter_salt if flags & FLAG_SCATTER else b'') + payload
+
+class HeaderedStream:
+    """
+    Carrier header + a payload of length bytes that is produced chunk by chunk (see package_payload_stream).
+    The embed functions take it in place of headered bytes; len() is the headered size.
+    """
+
+    def __init__(self, header: bytes, length: int, chunks):
+        self.header = header
+        self.length = length
+        self.chunks = iter(chunks)
+
+    def __len__(self):
+        return len(self.header) + self.length
+
+def package_payload_stream(chunks, length: int, bits_per_slot: int = 1, flags: int = 0) -> HeaderedStream:
+    """package_payload_bytes for a payload of length bytes given as an iterable of chunks (never joined)."""
+    if flags & FLAG_SCATTER:
+        raise ValueError("Scattered embedding needs the whole payload in memory; streamed payloads are sequential")
+    return HeaderedStream(_carrier_header(length, bits_per_slot, flags), length, chunks)
+
+def _header_of(data) -> bytes:
+    """The bytes that start with the carrier header: headered bytes as they are, or a stream's header."""
+    return data.header if isinstance(data, HeaderedStream) else data
 
 def unpackage_payload_bytes(headered: bytes) -> bytes:
     """Given payload that begins with header, return payload bytes (salt+token)."""
-    if len(headered) < HEADER_LEN:
+    if len(headered) < LEGACY_HEADER_LEN:
         raise ValueError("Headered data too short")
-    length = int.from_bytes(headered[:HEADER_LEN], byteorder='big')
-    if len(headered) - HEADER_LEN != length:
+    _, length, _, header_bits = parse_carrier_header(headered)
+    if len(headered) - header_bits // 8 != length:
         # either earlier extraction returned exactly payload (without header) or mismatch
         # but our image/audio extract functions return payload only (no header) — keep consistent:
         # This function prefers input with header; caller can adapt.
         raise ValueError("Length header mismatch")
-    return headered[HEADER_LEN:]
+    return headered[header_bits // 8:]
 
 # ---------------- CLI / Main flows ----------------
-def hide_image_flow(cover_image, out_image, message, password):
-    payload = encrypt_message(message, password)  # salt + token
-    headered = package_payload_bytes(payload)
-    embed_bytes_in_image(cover_image, out_image, headered)
+# Carriers may be paths, file-like objects or bytes; with out_* = None the hide flows return the stego bytes.
+# The extract flows return the decrypted message, or None (after logging the error) when decryption fails.
+# compress=False skips the compression stage (extraction detects it from the payload header either way).
+# bits=None lets the capacity planner pick the smallest k that fits; extraction reads k from the carrier header.
+# scatter=True spreads the payload over password-keyed positions; the payload salt doubles as scatter salt,
+# so hiding and extracting derive the key once (with the key cache on).
+def _package_for(payload: bytes, n_slots: int, bits=None, salt: bytes = None, scatter=False) -> bytes:
+    flags = FLAG_SCATTER if scatter else 0
+    if bits is None:
+        bits = plan_bits_per_slot(len(payload), n_slots, header_bits=carrier_header_bits(flags))
+    return package_payload_bytes(payload, bits, flags, scatter_salt=salt if scatter else None)
+
+def hide_image_flow(cover_image, out_image, message, password, compress=True, bits=None, scatter=False):
+    salt = secrets.token_bytes(SALT_SIZE)
+    payload = encrypt_message(message, password, salt=salt, compress=compress)
+    headered = _package_for(payload, image_slot_count(cover_image), bits, salt, scatter)
+    return embed_bytes_in_image(cover_image, out_image, headered, password=password)
 
 def extract_image_flow(stego_image, password):
     header_payload = None
@@ -276,27 +1773,505 @@ def extract_image_flow(stego_image, password):
     # But we stored header + payload. So we must extract full header+payload by adjusting extract function or
     # change embed behaviour. Simpler: extract bitstream extracting until header read and then payload size known.
     # We already wrote extract_bytes_from_image to return payload only (it reads header then payload). So call it:
-    payload = extract_bytes_from_image(stego_image)
+    payload = extract_bytes_from_image(stego_image, password=password)
     # payload here is salt+token
     try:
-        message = decrypt_message_from_payload(payload, password)
-        print("🔓 Decrypted message:\n", message)
+        return decrypt_message_from_payload(payload, password)
     except Exception as e:
-        print("❌ Decryption failed:", str(e))
+        logger.error("Decryption failed: %s", e)
+        return None
 
-def hide_audio_flow(cover_wav, out_wav, message, password):
-    payload = encrypt_message(message, password)
-    headered = package_payload_bytes(payload)
-    embed_bytes_in_wav(cover_wav, out_wav, headered)
+def hide_audio_flow(cover_wav, out_wav, message, password, compress=True, bits=None, scatter=False):
+    salt = secrets.token_bytes(SALT_SIZE)
+    payload = encrypt_message(message, password, salt=salt, compress=compress)
+    headered = _package_for(payload, audio_slot_count(cover_wav), bits, salt, scatter)
+    return embed_bytes_in_wav(cover_wav, out_wav, headered, password=password)
 
 def extract_audio_flow(stego_wav, password):
-    payload = extract_bytes_from_wav(stego_wav)
+    payload = extract_bytes_from_wav(stego_wav, password=password)
+    try:
+        return decrypt_message_from_payload(payload, password)
+    except Exception as e:
+        logger.error("Decryption failed: %s", e)
+        return None
+
+# ---------------- File payloads ----------------
+# Files of any size are hidden as v3 stream payloads: the source is read, sealed and embedded one chunk at a
+# time, and extraction decrypts straight into the output, so memory use does not grow with the payload.
+# Sources are a path, '-' for stdin (spooled to a temporary file when its size can't be known up front) or a
+# binary file object; outputs a path (written via a temporary file, so nothing is left behind when
+# decryption fails), '-' for stdout or a binary file object.
+@contextmanager
+def open_payload_source(src):
+    """Yield (binary file object, size in bytes) for a payload source."""
+    if isinstance(src, (str, os.PathLike)) and src != '-':
+        with open(src, 'rb') as f:
+            yield f, os.fstat(f.fileno()).st_size
+        return
+    f = sys.stdin.buffer if src == '-' else src
+    if f.seekable():
+        pos = f.tell()
+        size = f.seek(0, io.SEEK_END) - pos
+        f.seek(pos)
+        yield f, size
+        return
+    with tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE) as spool:
+        shutil.copyfileobj(f, spool, STREAM_CHUNK_SIZE)
+        size = spool.tell()
+        spool.seek(0)
+        yield spool, size
+
+@contextmanager
+def open_payload_sink(dest):
+    """Yield a binary file object for extracted plaintext; a path is only created once the block succeeds."""
+    if isinstance(dest, (str, os.PathLike)) and dest != '-':
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix='.steg-', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+            os.replace(tmp, dest)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return
+    yield sys.stdout.buffer if dest == '-' else dest
+
+def _hide_file(embed_fn, n_slots: int, cover, out, src, password, bits=None):
+    with open_payload_source(src) as (f, size):
+        length = stream_payload_length(size)
+        if bits is None:
+            bits = plan_bits_per_slot(length, n_slots)
+        headered = package_payload_stream(encrypt_stream(f, size, password), length, bits)
+        return embed_fn(cover, out, headered)
+
+def _extract_file(stream_fn, stego, password, dest):
+    length, chunks = stream_fn(stego, password=password)
+    reader = _ChunkReader(chunks)
+    magic = reader.read(3)
+    try:
+        if magic == PAYLOAD_MAGIC + bytes([STREAM_PAYLOAD_VERSION]):
+            with open_payload_sink(dest) as out:
+                return decrypt_stream(itertools.chain([magic], reader), length, password, out)
+        plain = decrypt_payload(magic + b''.join(reader), password)  # v2/v1 payloads are held whole anyway
+        with open_payload_sink(dest) as out:
+            out.write(plain)
+        return len(plain)
+    except Exception as e:
+        logger.error("Decryption failed: %s", e)
+        return None
+
+def hide_image_file_flow(cover_image, out_image, src, password, bits=None):
+    return _hide_file(embed_bytes_in_image, image_slot_count(cover_image), cover_image, out_image, src, password, bits)
+
+def extract_image_file_flow(stego_image, password, dest):
+    """Extract and decrypt the hidden payload into dest; returns the plaintext size, or None on failure."""
+    return _extract_file(stream_bytes_from_image, stego_image, password, dest)
+
+def hide_audio_file_flow(cover_wav, out_wav, src, password, bits=None):
+    return _hide_file(embed_bytes_in_wav, audio_slot_count(cover_wav), cover_wav, out_wav, src, password, bits)
+
+def extract_audio_file_flow(stego_wav, password, dest):
+    """Extract and decrypt the hidden payload into dest; returns the plaintext size, or None on failure."""
+    return _extract_file(stream_bytes_from_wav, stego_wav, password, dest)
+
+
+# ---------------- Batch processing ----------------
+# A batch source is a directory of carriers or a CSV/JSONL manifest with input[, output][, message] columns.
+# Items run across a process pool; every finished item appends one JSON line to the result log, and
+# --resume skips inputs the log already records as ok, so an interrupted batch picks up where it stopped.
+CARRIER_EXTENSIONS = ('.png', '.bmp', '.wav')
+
+def _carrier_kind(path: str) -> str:
+    return 'audio' if path.lower().endswith('.wav') else 'image'
+
+def load_batch_items(source: str, out_dir: str = None, message: str = None) -> list:
+    """Expand a directory or CSV/JSONL manifest into [{'input', 'output', 'message', 'kind'}, ...]."""
+    if os.path.isdir(source):
+        rows = [{'input': os.path.join(source, name)} for name in sorted(os.listdir(source))
+                if name.lower().endswith(CARRIER_EXTENSIONS)]
+    elif source.lower().endswith('.csv'):
+        with open(source, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    elif source.lower().endswith(('.jsonl', '.ndjson')):
+        with open(source, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        raise ValueError(f"Batch source must be a directory or a .csv/.jsonl manifest: {source}")
+    items = []
+    for row in rows:
+        if not row.get('input'):
+            raise ValueError(f"Manifest row without input: {row}")
+        output = row.get('output') or None
+        if output is None and out_dir is not None:
+            output = os.path.join(out_dir, os.path.basename(row['input']))
+        items.append({'input': row['input'], 'output': output,
+                      'message': row.get('message') or message, 'kind': _carrier_kind(row['input'])})
+    return items
+
+def _completed_inputs(log_path: str) -> set:
+    """Inputs already recorded as ok in an existing result log."""
+    done = set()
+    if log_path and os.path.exists(log_path):
+        with open(log_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                if record.get('status') == 'ok':
+                    done.add(record['input'])
+    return done
+
+def _batch_hide_item(item: dict, password: str, salt: bytes, scatter: bool = False) -> dict:
+    start = time.perf_counter()
+    record = {'input': item['input'], 'output': item['output'], 'kind': item['kind']}
     try:
+        if item['output'] is None or item['message'] is None:
+            raise ValueError("Item needs an output path and a message")
+        payload = encrypt_message(item['message'], password, salt=salt)
+        if item['kind'] == 'audio':
+            headered = _package_for(payload, audio_slot_count(item['input']), salt=salt, scatter=scatter)
+            embed_bytes_in_wav(item['input'], item['output'], headered, password=password)
+        else:
+            headered = _package_for(payload, image_slot_count(item['input']), salt=salt, scatter=scatter)
+            embed_bytes_in_image(item['input'], item['output'], headered, password=password)
+        record.update(status='ok', bytes=len(headered))
+    except Exception as e:
+        record.update(status='error', error=str(e))
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
+
+def _batch_extract_item(item: dict, password: str, log_messages: bool = False) -> dict:
+    start = time.perf_counter()
+    record = {'input': item['input'], 'output': item['output'], 'kind': item['kind']}
+    try:
+        if item['kind'] == 'audio':
+            payload = extract_bytes_from_wav(item['input'], password=password)
+        else:
+            payload = extract_bytes_from_image(item['input'], password=password)
         message = decrypt_message_from_payload(payload, password)
-        print("🔓 Decrypted message:\n", message)
+        if item['output'] is not None:
+            with open(item['output'], 'w', encoding='utf-8') as f:
+                f.write(message)
+        elif log_messages:
+            record['message'] = message
+        record.update(status='ok', bytes=len(payload))
     except Exception as e:
-        print("❌ Decryption failed:", str(e))
+        record.update(status='error', error=str(e))
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
 
+def run_batch(worker, items: list, worker_args: tuple, log_path: str, jobs: int = None, resume: bool = False) -> dict:
+    """Run worker(item, *worker_args) for every item over a process pool, appending records to log_path."""
+    if resume:
+        done = _completed_inputs(log_path)
+        skipped = sum(1 for item in items if item['input'] in done)
+        items = [item for item in items if item['input'] not in done]
+    else:
+        skipped = 0
+    summary = {'ok': 0, 'error': 0, 'skipped': skipped}
+    start = time.perf_counter()
+    with open(log_path, 'a' if resume else 'w', encoding='utf-8') as log, \
+            ProcessPoolExecutor(max_workers=jobs, initializer=enable_key_cache) as pool:
+        futures = [pool.submit(worker, item, *worker_args) for item in items]
+        for future in as_completed(futures):
+            record = future.result()
+            summary[record['status']] += 1
+            log.write(json.dumps(record) + '\n')
+            log.flush()
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
+
+def batch_hide_flow(source, out_dir, message, password, log_path, jobs=None, resume=False, scatter=False):
+    items = load_batch_items(source, out_dir, message)
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    # one salt for the whole batch, so each worker runs PBKDF2 once and reuses the key (each payload still gets a
+    # fresh random GCM nonce); with scatter it also keys the permutation, so same-sized covers reuse the cached
+    # position indexes
+    salt = secrets.token_bytes(SALT_SIZE)
+    return run_batch(_batch_hide_item, items, (password, salt, scatter), log_path, jobs, resume)
+
+def batch_extract_flow(source, out_dir, password, log_path, jobs=None, resume=False, log_messages=False):
+    """
+    Extract every item to its output path (manifest column or <out_dir>/<name>.txt). The result log only holds
+    status and timings; log_messages=True also writes the messages of items without an output into it.
+    """
+    items = load_batch_items(source, None, None)
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        for item in items:
+            if item['output'] is None:
+                stem = os.path.splitext(os.path.basename(item['input']))[0]
+                item['output'] = os.path.join(out_dir, stem + '.txt')
+    if not log_messages and any(item['output'] is None for item in items):
+        raise ValueError("Items without an output path need --output-dir (or --log-messages to put the plaintext "
+                         "into the result log)")
+    return run_batch(_batch_extract_item, items, (password, log_messages), log_path, jobs, resume)
+
+# ---------------- Sharding ----------------
+# One encrypted payload can be spread over several covers (images and/or WAVs). Each cover gets a shard
+# record [payload id(16)][index][count][SHA-256 of the whole payload][chunk] behind a carrier header with
+# FLAG_SHARD set. Chunks are sized in proportion to each cover's capacity, the password is derived once, and
+# embedding/extraction of the shards run across a process pool. Shards can be given back in any order;
+# reassembly checks that they form one complete set and that the joined payload matches its hash.
+def split_payload(payload: bytes, weights: list) -> list:
+    """
+    Cut payload into len(weights) shard records with chunk sizes proportional to weights (e.g. slot counts).
+    Every chunk gets at least one byte (a record without one is not a valid shard), the rest is shared out.
+    """
+    count = len(weights)
+    if not 1 <= count <= 0xFFFF:
+        raise ValueError(f"Shard count must be 1..65535, got {count}")
+    if count > len(payload):
+        raise ValueError(f"Too many covers: {count} shards for a {len(payload)}-byte payload")
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        raise ValueError("Covers have no capacity")
+    payload_id = secrets.token_bytes(16)
+    digest = hashlib.sha256(payload).digest()
+    records = []
+    start = 0
+    cumulative = 0
+    for index, weight in enumerate(weights):
+        cumulative += weight
+        end = index + 1 + (len(payload) - count) * cumulative // total_weight
+        records.append(SHARD_HEADER.pack(payload_id, index, count, digest) + payload[start:end])
+        start = end
+    return records
+
+def join_shards(records: list) -> bytes:
+    """Reassemble shard records given in any order; raises ValueError if any is missing, foreign or corrupt."""
+    if not records:
+        raise ValueError("No shards given")
+    shards = {}
+    payload_id = count = digest = None
+    for record in records:
+        if len(record) < SHARD_HEADER.size:
+            raise ValueError("Shard record too short")
+        rid, index, rcount, rdigest = SHARD_HEADER.unpack_from(record)
+        if payload_id is None:
+            payload_id, count, digest = rid, rcount, rdigest
+        elif (rid, rcount, rdigest) != (payload_id, count, digest):
+            raise ValueError("Shards belong to different payloads")
+        if index >= count or index in shards:
+            raise ValueError(f"Invalid or duplicate shard index {index}")
+        shards[index] = record[SHARD_HEADER.size:]
+    if len(shards) != count:
+        missing = sorted(set(range(count)) - set(shards))
+        raise ValueError(f"Missing shards {missing} of {count}")
+    payload = b''.join(shards[i] for i in range(count))
+    if hashlib.sha256(payload).digest() != digest:
+        raise ValueError("Shard integrity check failed (payload hash mismatch)")
+    return payload
+
+def _embed_shard(cover: str, output: str, headered: bytes):
+    if _carrier_kind(cover) == 'audio':
+        embed_bytes_in_wav(cover, output, headered)
+    else:
+        embed_bytes_in_image(cover, output, headered)
+    return output
+
+def _extract_shard(stego: str) -> bytes:
+    if _carrier_kind(stego) == 'audio':
+        return extract_bytes_from_wav(stego, shard=True)
+    return extract_bytes_from_image(stego, shard=True)
+
+def hide_shards_flow(covers: list, outputs: list, message, password, compress=True, bits=None, jobs=None) -> list:
+    """Encrypt message once and spread it over covers (paths), writing one stego carrier per output path."""
+    if len(covers) != len(outputs):
+        raise ValueError("Need one output path per cover")
+    payload = encrypt_message(message, password, compress=compress)
+    slots = [image_slot_count(c) if _carrier_kind(c) == 'image' else audio_slot_count(c) for c in covers]
+    headered = []
+    for record, n_slots in zip(split_payload(payload, slots), slots):
+        k = bits if bits is not None else plan_bits_per_slot(len(record), n_slots)
+        headered.append(package_payload_bytes(record, k, FLAG_SHARD))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_embed_shard, covers, outputs, headered))
+
+def extract_shards_flow(stegos: list, password, jobs=None):
+    """Pull the shard records out of stegos (paths, any order) in parallel, reassemble, verify and decrypt."""
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        records = list(pool.map(_extract_shard, stegos))
+    payload = join_shards(records)
+    try:
+        return decrypt_message_from_payload(payload, password)
+    except Exception as e:
+        logger.error("Decryption failed: %s", e)
+        return None
+
+# ---------------- Service jobs ----------------
+# Picklable process-pool jobs shared by the web backends (backend.py, asgi_backend.py); carriers arrive and
+# leave as bytes.
+FORM_FLAG_OFF = ('', '0', 'false', 'off', 'no')
+
+def parse_form_flag(value) -> bool:
+    """Optional checkbox-style form value (str or bytes): set unless empty/0/false/off/no."""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8', 'replace')
+    return value.strip().lower() not in FORM_FLAG_OFF
+
+def hide_message_job(hide_flow, cover: bytes, message, password, scatter=False) -> bytes:
+    """Encrypt message and embed it into the cover with hide_flow, returning the stego bytes."""
+    return hide_flow(cover, None, message, password, scatter=scatter)
+
+def hide_file_job(hide_file_flow, cover: bytes, data: bytes, password) -> bytes:
+    """Embed data as a chunked stream payload with hide_file_flow, returning the stego bytes."""
+    return hide_file_flow(cover, None, io.BytesIO(data), password)
+
+def extract_job(extract_fn, stego: bytes, password, payload: bytes = None, as_bytes=False) -> tuple:
+    """
+    Pull the payload out of stego with extract_fn (unless an already extracted payload is given) and decrypt
+    it, as text or, with as_bytes=True, as the raw plaintext of a file payload. Returns (payload, plaintext,
+    error): a decryption failure is returned, not raised, so the caller can still cache the payload.
+    """
+    if payload is None:
+        payload = extract_fn(stego, password=password)  # the password locates a scattered payload
+    decrypt = decrypt_payload if as_bytes else decrypt_message_from_payload
+    try:
+        return payload, decrypt(payload, password), None
+    except Exception as e:
+        return payload, None, str(e)
+
+# ---------------- Daemon ----------------
+# `serve` keeps a process pool warm (imports done, derived-key cache on) behind a Unix socket that only the
+# current user can open. While it runs, the other subcommands send their argv and working directory to it
+# and print what it sends back, instead of importing PIL/numpy/cryptography themselves.
+# One request per connection: a JSON line {"argv", "cwd"} in, a JSON line {"status", "stdout", "stderr"} out.
+# The argv carries passwords and messages, so a client only talks to a socket owned by its own user, and the
+# socket lives in a directory no other user controls.
+def default_socket_path() -> str:
+    if os.environ.get(SERVE_SOCKET_ENV):
+        return os.environ[SERVE_SOCKET_ENV]
+    if not hasattr(os, 'getuid'):
+        return os.path.join(tempfile.gettempdir(), 'secure_steg.sock')
+    if os.environ.get('XDG_RUNTIME_DIR'):  # already private to the user
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], f'secure_steg-{os.getuid()}.sock')
+    # the shared temp dir is writable by everyone: use a directory of our own inside it
+    return os.path.join(tempfile.gettempdir(), f'secure_steg-{os.getuid()}', 'daemon.sock')
+
+def _check_private_dir(directory: str, what: str, sticky_ok: bool = False):
+    """
+    Create directory (0700) if it is missing and refuse one that another user controls: it must be owned by
+    the current user and not writable by group/others. sticky_ok also accepts a sticky directory owned by
+    root or the user (like /tmp), where others can add entries but not replace ours.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return
+    st = os.stat(directory)
+    private = st.st_uid == os.getuid() and not st.st_mode & 0o022
+    sticky = sticky_ok and st.st_uid in (0, os.getuid()) and st.st_mode & stat.S_ISVTX
+    if not (private or sticky):
+        raise RuntimeError(f"Refusing to use {directory} for the {what}: another user can write to it")
+
+def _is_own_socket(path: str) -> bool:
+    """True if path is a Unix socket (not a symlink to one) owned by the current user."""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and (not hasattr(os, 'getuid') or st.st_uid == os.getuid())
+
+def _warm_worker():
+    """Pool initializer: load the lazy modules and turn on the key cache once per worker."""
+    # workers fork after serve() installed its SIGTERM handler; a group-wide SIGTERM or Ctrl-C must only
+    # reach the parent, which shuts the pool down itself
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    enable_key_cache()
+    for module in (Image, np, fernet, aead, pbkdf2, hashes, crypto_exceptions):
+        if module is not None:
+            getattr(module, '__name__')
+
+def _run_forwarded(argv: list, cwd: str) -> dict:
+    """Run one CLI invocation inside a daemon worker, capturing its output and log lines."""
+    out, err = io.StringIO(), io.StringIO()
+    handler = logging.StreamHandler(err)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    saved = logger.level, logger.propagate
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    status = 0
+    try:
+        os.chdir(cwd)
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                status = run_command(build_arg_parser().parse_args(argv))
+            except SystemExit as e:  # argparse errors and --help
+                status = e.code if isinstance(e.code, int) else 1
+    finally:
+        logger.removeHandler(handler)
+        logger.level, logger.propagate = saved
+    return {'status': status, 'stdout': out.getvalue(), 'stderr': err.getvalue()}
+
+def forward_to_daemon(argv: list, socket_path: str = None):
+    """Run argv on a running daemon and relay its output; returns the exit status, or None if no daemon answered."""
+    path = socket_path or default_socket_path()
+    if not os.path.lexists(path):
+        return None
+    if not _is_own_socket(path):
+        logger.warning("Ignoring %s: not a socket owned by you; running locally", path)
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            with sock.makefile('rwb') as f:
+                f.write(json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode('utf-8') + b'\n')
+                f.flush()
+                line = f.readline()
+    except OSError:
+        return None  # stale socket file or daemon going down: run locally
+    if not line:
+        return None
+    response = json.loads(line)
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+def serve(socket_path: str = None, jobs: int = None):
+    """Run the daemon until SIGINT/SIGTERM. Refuses to start if another daemon answers on the socket."""
+    path = socket_path or default_socket_path()
+    _check_private_dir(os.path.dirname(os.path.abspath(path)), 'daemon socket', sticky_ok=True)
+    if os.path.lexists(path):
+        if not _is_own_socket(path):
+            raise RuntimeError(f"{path} exists and is not a socket owned by you")
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(path)
+            raise RuntimeError(f"A daemon is already serving on {path}")
+        except OSError:
+            os.unlink(path)  # left behind by a daemon that did not shut down cleanly
+    pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            try:
+                response = pool.submit(_run_forwarded, request['argv'], request['cwd']).result()
+            except Exception as e:
+                response = {'status': 1, 'stdout': '', 'stderr': f"Error: {e}\n"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+    old_umask = os.umask(0o177)  # socket is created owner-only (0600)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    logger.info("Serving on %s (%d workers)", path, jobs or os.cpu_count())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if _is_own_socket(path):
+            os.unlink(path)
+        pool.shutdown(cancel_futures=True)
 
 # ---------------- Command-line interface ----------------
 def build_arg_parser():
@@ -307,46 +2282,169 @@ def build_arg_parser():
     hi = sub.add_parser('hide_image', help='Embed message into image (LSB)')
     hi.add_argument('-i', '--input', required=True, help='Input cover image path (PNG/BMP recommended)')
     hi.add_argument('-o', '--output', required=True, help='Output stego image path')
-    hi.add_argument('-m', '--message', required=True, help='Message to hide')
     hi.add_argument('-p', '--password', required=True, help='Password for encryption')
+    hi.add_argument('--no-compress', action='store_true', help='Do not compress the message before encryption')
+    hi.add_argument('-k', '--bits', type=int, choices=range(1, MAX_BITS_PER_SLOT + 1), default=None,
+                    help='LSBs per channel for the payload (default: smallest that fits)')
 
     ei = sub.add_parser('extract_image', help='Extract message from stego image')
     ei.add_argument('-i', '--input', required=True, help='Input stego image path')
     ei.add_argument('-p', '--password', required=True, help='Password for decryption')
 
-    ha = sub.add_parser('hide_audio', help='Embed message into WAV (16-bit PCM)')
-    ha.add_argument('-i', '--input', required=True, help='Input WAV path (16-bit PCM)')
+    ha = sub.add_parser('hide_audio', help='Embed message into WAV (8/16/24/32-bit PCM)')
+    ha.add_argument('-i', '--input', required=True, help='Input WAV path (8/16/24/32-bit PCM)')
     ha.add_argument('-o', '--output', required=True, help='Output stego WAV path')
-    ha.add_argument('-m', '--message', required=True, help='Message to hide')
     ha.add_argument('-p', '--password', required=True, help='Password for encryption')
+    ha.add_argument('--no-compress', action='store_true', help='Do not compress the message before encryption')
+    ha.add_argument('-k', '--bits', type=int, choices=range(1, MAX_BITS_PER_SLOT + 1), default=None,
+                    help='LSBs per sample for the payload (default: smallest that fits)')
+
+    for hp in (hi, ha):
+        hp.add_argument('--scatter', action='store_true',
+                        help='Spread the payload over password-keyed positions instead of the leading ones')
+        what = hp.add_mutually_exclusive_group(required=True)
+        what.add_argument('-m', '--message', help='Message to hide')
+        what.add_argument('-f', '--file', help="File to hide instead of a message ('-' reads stdin); "
+                                               "streamed in chunks, never compressed or held in memory")
 
     ea = sub.add_parser('extract_audio', help='Extract message from stego WAV')
     ea.add_argument('-i', '--input', required=True, help='Input stego WAV path')
     ea.add_argument('-p', '--password', required=True, help='Password for decryption')
 
+    for ep in (ei, ea):
+        ep.add_argument('-o', '--output-file', default=None,
+                        help="Write the hidden payload to this file ('-' for stdout) instead of printing a message")
+
+    bh = sub.add_parser('batch_hide', help='Embed messages into a directory or manifest of carriers in parallel')
+    bh.add_argument('-i', '--input', required=True, help='Directory of PNG/BMP/WAV covers, or CSV/JSONL manifest (input,output,message)')
+    bh.add_argument('-o', '--output-dir', help='Directory for stego outputs of items without an output column')
+    bh.add_argument('-m', '--message', help='Message for items without a message column')
+    bh.add_argument('-p', '--password', required=True, help='Password for encryption')
+    bh.add_argument('--scatter', action='store_true', help='Spread each payload over password-keyed positions')
+
+    be = sub.add_parser('batch_extract', help='Extract messages from a directory or manifest of stego carriers in parallel')
+    be.add_argument('-i', '--input', required=True, help='Directory of stego PNG/BMP/WAV files, or CSV/JSONL manifest (input[,output])')
+    be.add_argument('-o', '--output-dir', help='Write each message to <output-dir>/<name>.txt (items without an output column)')
+    be.add_argument('-p', '--password', required=True, help='Password for decryption')
+    be.add_argument('--log-messages', action='store_true',
+                    help='Put the plaintext of items without an output into the result log (default: status only)')
+
+    hs = sub.add_parser('hide_shards', help='Split one message across several covers (PNG/BMP/WAV) in parallel')
+    hs.add_argument('-i', '--input', required=True, nargs='+', help='Cover paths (PNG/BMP/WAV), one shard each')
+    hs.add_argument('-o', '--output-dir', required=True, help='Directory for the stego shards (same file names)')
+    hs.add_argument('-m', '--message', required=True, help='Message to hide')
+    hs.add_argument('-p', '--password', required=True, help='Password for encryption')
+    hs.add_argument('--no-compress', action='store_true', help='Do not compress the message before encryption')
+    hs.add_argument('-k', '--bits', type=int, choices=range(1, MAX_BITS_PER_SLOT + 1), default=None,
+                    help='LSBs per channel/sample for every shard (default: smallest that fits each cover)')
+
+    es = sub.add_parser('extract_shards', help='Reassemble and decrypt a message from all of its stego shards')
+    es.add_argument('-i', '--input', required=True, nargs='+', help='Stego shard paths, in any order')
+    es.add_argument('-p', '--password', required=True, help='Password for decryption')
+
+    for sp in (hs, es):
+        sp.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+
+    for bp in (bh, be):
+        bp.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+        bp.add_argument('-l', '--log', default='batch_results.jsonl', help='JSONL result log (one record per carrier)')
+        bp.add_argument('--resume', action='store_true', help='Skip inputs the log already records as ok and append to it')
+
+    sv = sub.add_parser('serve', help='Run a local daemon that the other subcommands forward to while it is up')
+    sv.add_argument('-s', '--socket', default=None, help=f'Unix socket path (default: ${SERVE_SOCKET_ENV} or a per-user path)')
+    sv.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: CPU count)')
+
     return p
 
-def main():
-    parser = build_arg_parser()
-    args = parser.parse_args()
+def _print_message(message) -> int:
+    """Print a decrypted message; returns the exit status (1: decryption failed, nothing to print)."""
+    if message is None:
+        return 1
+    print("🔓 Decrypted message:\n", message)
+    return 0
 
+def run_command(args) -> int:
+    """
+    Execute parsed CLI arguments (in-process, or inside a daemon worker). Returns the exit status: 1 when the
+    command failed, extraction or decryption included, or when any batch item failed.
+    """
+    status = 0
     try:
-        if args.cmd == 'hide_image':
-            cap = image_capacity_bytes(args.input)
-            # payload size estimate: encrypted message size could be larger; do quick check after encryption inside function
-            hide_image_flow(args.input, args.output, args.message, args.password)
+        if args.cmd in ('hide_image', 'hide_audio') and args.file is not None:
+            if args.scatter:
+                raise ValueError("--scatter needs the payload in memory and cannot be combined with --file")
+            hide_file_flow = hide_image_file_flow if args.cmd == 'hide_image' else hide_audio_file_flow
+            hide_file_flow(args.input, args.output, args.file, args.password, bits=args.bits)
+
+        elif args.cmd in ('extract_image', 'extract_audio') and args.output_file is not None:
+            extract_file_flow = extract_image_file_flow if args.cmd == 'extract_image' else extract_audio_file_flow
+            size = extract_file_flow(args.input, args.password, args.output_file)
+            if size is None:
+                status = 1
+            elif args.output_file != '-':
+                print(f"Wrote {size} bytes to {args.output_file}")
+
+        elif args.cmd == 'hide_image':
+            hide_image_flow(args.input, args.output, args.message, args.password, compress=not args.no_compress,
+                            bits=args.bits, scatter=args.scatter)
 
         elif args.cmd == 'extract_image':
-            extract_image_flow(args.input, args.password)
+            status = _print_message(extract_image_flow(args.input, args.password))
 
         elif args.cmd == 'hide_audio':
-            hide_audio_flow(args.input, args.output, args.message, args.password)
+            hide_audio_flow(args.input, args.output, args.message, args.password, compress=not args.no_compress,
+                            bits=args.bits, scatter=args.scatter)
 
         elif args.cmd == 'extract_audio':
-            extract_audio_flow(args.input, args.password)
+            status = _print_message(extract_audio_flow(args.input, args.password))
+
+        elif args.cmd == 'hide_shards':
+            os.makedirs(args.output_dir, exist_ok=True)
+            outputs = [os.path.join(args.output_dir, os.path.basename(c)) for c in args.input]
+            hide_shards_flow(args.input, outputs, args.message, args.password, compress=not args.no_compress,
+                             bits=args.bits, jobs=args.jobs)
+            print(f"Wrote {len(outputs)} shards to {args.output_dir}")
+
+        elif args.cmd == 'extract_shards':
+            status = _print_message(extract_shards_flow(args.input, args.password, jobs=args.jobs))
+
+        elif args.cmd == 'batch_hide':
+            summary = batch_hide_flow(args.input, args.output_dir, args.message, args.password,
+                                      args.log, args.jobs, args.resume, args.scatter)
+            print(f"Batch done: {summary} (log: {args.log})")
+            status = 1 if summary['error'] else 0
+
+        elif args.cmd == 'batch_extract':
+            summary = batch_extract_flow(args.input, args.output_dir, args.password, args.log, args.jobs, args.resume,
+                                         args.log_messages)
+            print(f"Batch done: {summary} (log: {args.log})")
+            status = 1 if summary['error'] else 0
 
     except Exception as e:
-        print("Error:", e)
+        logger.error("Error: %s", e)
+        status = 1
+    return status
+
+def main():
+    argv = sys.argv[1:]
+    # forward to a running daemon before parsing anything; help, serve itself and stdin/stdout payloads ('-')
+    # always run here
+    if argv and argv[0] != 'serve' and not {'-h', '--help', '-'} & set(argv) and not os.environ.get(NO_DAEMON_ENV):
+        status = forward_to_daemon(argv)
+        if status is not None:
+            sys.exit(status)
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.cmd == 'serve':
+        try:
+            serve(args.socket, args.jobs)
+        except RuntimeError as e:  # socket path in use or not safe to use
+            logger.error("Error: %s", e)
+            sys.exit(1)
+    else:
+        enable_key_cache()  # scattered carriers derive the same key for the positions and the payload
+        sys.exit(run_command(args))
 
 if __name__ == '__main__':
     main()